@@ -1,20 +1,184 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
-from .models import (    
-    User, 
-    EmailVerificationToken, 
-    UserSession, 
-    FailedLoginAttempt, 
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import (
+    User,
+    EmailVerificationToken,
+    UserSession,
+    FailedLoginAttempt,
+    FailedLoginCounter,
+    Job,
     PasswordResetToken,
     UserRegistrationInfo,
     UserDeviceInfo
 )
 
+# Query string parameter carrying the last primary key of the previous page
+CURSOR_VAR = 'before'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs a full COUNT(*).
+
+    Unfiltered changelists read the row estimate the planner keeps in
+    pg_class; filtered changelists count at most `count_limit` rows.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimated_table_rows(queryset)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+    def estimated_table_rows(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList that pages by primary key instead of OFFSET.
+
+    Each page is `WHERE pk < <cursor> ORDER BY pk DESC LIMIT n + 1`, so the
+    cost of a page does not depend on how deep into the table it is.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET.get(CURSOR_VAR, ''))
+        except ValueError:
+            self.cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.cursor is not None:
+            queryset = queryset.filter(pk__lt=self.cursor)
+        return queryset
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        rows = list(self.queryset[:self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or self.cursor is not None
+        self.paginator = paginator
+        self.next_cursor = rows[-1].pk if has_next else None
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor is None:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class KeysetModelAdmin(admin.ModelAdmin):
+    """Base admin for append-heavy tables with millions of rows"""
+    change_list_template = 'admin/accounts/keyset_change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Sorting by arbitrary columns would defeat keyset paging
+    sortable_by = ()
+    list_per_page = 50
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+@admin.register(FailedLoginAttempt)
+class FailedLoginAttemptAdmin(KeysetModelAdmin):
+    list_display = ('email', 'ip_address', 'timestamp')
+    # Exact lookups hit the (email, ip_address, timestamp) index
+    search_fields = ('email__exact',)
+    search_help_text = 'Exact email address'
+
+
+@admin.register(FailedLoginCounter)
+class FailedLoginCounterAdmin(KeysetModelAdmin):
+    list_display = ('email', 'ip_address', 'bucket', 'count')
+    # Exact lookups hit the (email, ip_address, bucket) unique index
+    search_fields = ('email__exact',)
+    search_help_text = 'Exact email address'
+
+
+@admin.register(Job)
+class JobAdmin(KeysetModelAdmin):
+    list_display = ('name', 'queue', 'status', 'run_at', 'attempts', 'started_at', 'finished_at')
+    list_filter = ('status', 'queue')
+    search_fields = ('name__exact',)
+    search_help_text = 'Exact job name'
+    readonly_fields = ('attempts', 'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'last_error')
+
+
+@admin.register(UserDeviceInfo)
+class UserDeviceInfoAdmin(KeysetModelAdmin):
+    list_display = ('user', 'device_type', 'os_type', 'browser', 'ip_address', 'is_active', 'last_used')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email__exact',)
+    search_help_text = 'Exact email address'
+
+
+@admin.register(UserRegistrationInfo)
+class UserRegistrationInfoAdmin(KeysetModelAdmin):
+    list_display = ('user', 'registration_status', 'registration_source', 'registered_at', 'verified_at')
+    list_select_related = ('user',)
+    list_filter = ('registration_status',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email__exact',)
+    search_help_text = 'Exact email address'
+
+
+class TokenAdmin(KeysetModelAdmin):
+    list_display = ('user', 'created_at', 'expires_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('token__exact',)
+    search_help_text = 'Exact token'
+
+
 # Register your models here.
 admin.site.register(User, UserAdmin)
-admin.site.register(EmailVerificationToken)
+admin.site.register(EmailVerificationToken, TokenAdmin)
 admin.site.register(UserSession)
-admin.site.register(FailedLoginAttempt)
-admin.site.register(PasswordResetToken)
-admin.site.register(UserRegistrationInfo)
-admin.site.register(UserDeviceInfo)
\ No newline at end of file
+admin.site.register(PasswordResetToken, TokenAdmin)
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import tasks  # noqa: F401 (registers the background jobs)
+        from .jwks import KeyRotatingTokenBackend, jwt_keys_enabled
+
+        if jwt_keys_enabled():
+            # Every simplejwt token class resolves its backend through this
+            # class attribute, so this switches signing and verification
+            # for access and refresh tokens alike.
+            from rest_framework_simplejwt.tokens import Token
+
+            Token._token_backend = KeyRotatingTokenBackend()
@@ -0,0 +1,344 @@
+"""
+ASGI-native versions of the public accounts endpoints.
+
+They mirror the request/response contract of the DRF views in views.py but
+run entirely on the event loop: database access goes through the async ORM,
+password hashing runs in a thread pool so it never blocks the loop, and mail
+goes through `adeliver_mail`, which queues it like the sync views when
+ACCOUNTS_MAIL_VIA_JOBS is set. Which implementation serves a URL is chosen in
+urls.py through the ACCOUNTS_ASYNC_VIEWS setting.
+"""
+import json
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponseRedirect, JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .client_ip import get_client_ip
+from .failed_logins import record_failed_login
+from .idempotency import aidempotent
+from .last_login import last_login_buffer
+from .lockout import lockout
+from .models import (
+    EmailVerificationToken,
+    PasswordResetToken,
+    UserDeviceInfo,
+    UserRegistrationInfo,
+)
+from .rollups import schedule_registration_rollup_refresh
+from .serializers import (
+    AsyncForgotPasswordSerializer,
+    AsyncRegistrationSerializer,
+    AsyncResetPasswordSerializer,
+    UserReadSerializer,
+)
+from .tiered_cache import invalidate_user, user_id_by_email
+from .utils import (
+    adeliver_mail,
+    asend_verification_email,
+    delivered_status,
+    get_device_info,
+    ais_verification_token_used,
+    amark_verification_token_used,
+)
+from .verification_tokens import decode_verification_token
+
+User = get_user_model()
+
+
+def request_data(request):
+    """Parsed JSON or form body, or None if the JSON is malformed"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+def parse_error():
+    return JsonResponse({'detail': 'JSON parse error'}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    http_method_names = ['post', 'options']
+
+
+class AsyncRegisterView(AsyncAPIView):
+    @aidempotent
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return parse_error()
+        serializer = AsyncRegistrationSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        validated = serializer.validated_data
+        email = User.objects.normalize_email(validated['email'])
+
+        errors = {}
+        existing = User.objects.filter(Q(email=email) | Q(username=validated['username']))
+        async for existing_email, existing_username in existing.values_list('email', 'username'):
+            if existing_email == email:
+                errors['email'] = ['user with this email already exists.']
+            if existing_username == validated['username']:
+                errors['username'] = ['A user with that username already exists.']
+        if errors:
+            return JsonResponse(errors, status=400)
+
+        user = User(email=email, username=validated['username'])
+        await sync_to_async(user.set_password, thread_sensitive=False)(validated['password'])
+        try:
+            await user.asave()
+        except IntegrityError:
+            # Lost a race with a concurrent registration for the same account
+            return JsonResponse({'email': ['user with this email already exists.']}, status=400)
+
+        ip_address = get_client_ip(request)
+        await UserRegistrationInfo.objects.acreate(
+            user=user,
+            ip_address=ip_address,
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            registration_source='api'
+        )
+        await UserDeviceInfo.objects.acreate(
+            user=user,
+            ip_address=ip_address,
+            **get_device_info(request.META.get('HTTP_USER_AGENT', ''))
+        )
+        await sync_to_async(schedule_registration_rollup_refresh)()
+
+        await EmailVerificationToken.objects.acreate(
+            user=user,
+            token=str(uuid.uuid4()),
+            expires_at=timezone.now() + timedelta(hours=24)
+        )
+
+        email_status, verification_info = await asend_verification_email(user)
+
+        response_data = {
+            'message': 'Registration successful. Please check your email to verify your account.',
+            'email_status': email_status
+        }
+        if settings.DEBUG:
+            response_data['debug_info'] = {
+                'verification_link': verification_info
+            }
+        if email_status == 'failed':
+            response_data['error'] = verification_info
+
+        return JsonResponse(response_data, status=201)
+
+
+class AsyncTokenObtainPairView(AsyncAPIView):
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return parse_error()
+        email = data.get('email', '')
+        password = data.get('password', '')
+        ip_address = get_client_ip(request)
+
+        retry_after = await lockout.aretry_after(email, ip_address)
+        if retry_after:
+            return self.locked_out_response(retry_after)
+
+        user = None
+        if email and password:
+            try:
+                user = await User.objects.aget(email=email)
+            except User.DoesNotExist:
+                # Hash anyway so response time does not reveal unknown emails
+                await sync_to_async(User().set_password, thread_sensitive=False)(password)
+            else:
+                valid = await sync_to_async(user.check_password, thread_sensitive=False)(password)
+                if not valid or not user.is_active:
+                    user = None
+
+        if user is None:
+            retry_after = await lockout.aregister_failure(email, ip_address)
+            await sync_to_async(record_failed_login)(email, ip_address)
+            if retry_after:
+                return self.locked_out_response(retry_after)
+            return JsonResponse({'detail': 'Invalid email or password'}, status=401)
+
+        await lockout.areset(email)
+        refresh = RefreshToken.for_user(user)
+        now = timezone.now()
+        if getattr(settings, 'ACCOUNTS_BATCH_LAST_LOGIN', False):
+            # record() flushes through the ORM once max_pending is reached
+            await sync_to_async(last_login_buffer.record)(user.pk, now)
+        else:
+            await User.objects.filter(pk=user.pk).aupdate(last_login=now)
+
+        return JsonResponse({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user': UserReadSerializer(user).data,
+        })
+
+    def locked_out_response(self, retry_after):
+        response = JsonResponse(
+            {'detail': 'Too many failed attempts. Please try again later.'},
+            status=429
+        )
+        response['Retry-After'] = str(retry_after)
+        return response
+
+
+class AsyncForgotPasswordView(AsyncAPIView):
+    async def send_password_reset_email(self, user, reset_link):
+        context = {
+            'user': user,
+            'reset_link': reset_link
+        }
+        html_message = render_to_string('accounts/emails/password_reset.html', context)
+        plain_message = render_to_string('accounts/emails/password_reset.txt', context)
+
+        try:
+            await adeliver_mail(
+                subject='Reset Your Password',
+                message=plain_message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[user.email],
+                html_message=html_message,
+            )
+            return delivered_status(), None
+        except Exception as e:
+            return 'failed', str(e)
+
+    @aidempotent
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return parse_error()
+        serializer = AsyncForgotPasswordSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        email = serializer.validated_data['email']
+        # Same cached lookup as ForgotPasswordSerializer
+        user_id = await user_id_by_email.aget_or_load(
+            email, lambda: User.objects.filter(email=email).values_list('id', flat=True).first()
+        )
+        if user_id is None:
+            return JsonResponse({'email': ['No user found with this email address.']}, status=400)
+        try:
+            user = await User.objects.aget(pk=user_id)
+        except User.DoesNotExist:
+            return JsonResponse({
+                'message': 'Password reset instructions have been sent to your email if an account exists with this email address.'
+            })
+
+        token = str(uuid.uuid4())
+        await PasswordResetToken.objects.filter(user=user).adelete()
+        await PasswordResetToken.objects.acreate(
+            user=user,
+            token=token,
+            expires_at=timezone.now() + timedelta(hours=24)
+        )
+
+        reset_link = f"{settings.FRONTEND_URL}/reset-password/{token}"
+        email_status, error = await self.send_password_reset_email(user, reset_link)
+
+        response_data = {
+            'message': 'Password reset instructions have been sent to your email.'
+        }
+        if settings.DEBUG:
+            response_data['debug_info'] = {
+                'reset_link': reset_link,
+                'email_status': email_status,
+            }
+            if email_status == 'failed':
+                response_data['debug_info']['error'] = error
+
+        return JsonResponse(response_data)
+
+
+class AsyncResetPasswordView(AsyncAPIView):
+    @aidempotent
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return parse_error()
+        serializer = AsyncResetPasswordSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        try:
+            reset_token = await PasswordResetToken.objects.select_related('user').aget(
+                token=serializer.validated_data['token'],
+                expires_at__gt=timezone.now()
+            )
+        except PasswordResetToken.DoesNotExist:
+            return JsonResponse({'non_field_errors': ['Invalid or expired reset token']}, status=400)
+
+        user = reset_token.user
+        await sync_to_async(user.set_password, thread_sensitive=False)(
+            serializer.validated_data['new_password']
+        )
+        await user.asave()
+        await PasswordResetToken.objects.filter(user=user).adelete()
+
+        return JsonResponse({
+            'message': 'Password has been reset successfully.'
+        })
+
+
+@sync_to_async
+def verify_email(user_id, email):
+    """Conditional verification UPDATE; returns True if this call verified the user"""
+    verified_at = timezone.now()
+    with transaction.atomic():
+        verified = User.objects.filter(
+            id=user_id,
+            email=email,
+            is_email_verified=False
+        ).update(is_email_verified=True, updated_at=verified_at)
+        if verified:
+            UserRegistrationInfo.objects.filter(user_id=user_id).update(
+                registration_status='verified',
+                verified_at=verified_at
+            )
+            invalidate_user(user_id)
+    if verified:
+        schedule_registration_rollup_refresh()
+    return bool(verified)
+
+
+class AsyncVerifyEmailConfirmView(View):
+    async def get(self, request):
+        token = request.GET.get('token')
+        if not token:
+            return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/error")
+
+        if await ais_verification_token_used(token):
+            return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/already-verified")
+
+        try:
+            data = decode_verification_token(token)
+        except signing.BadSignature:
+            return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/error")
+
+        if not await verify_email(data['user_id'], data['email']):
+            if not await User.objects.filter(id=data['user_id'], email=data['email']).aexists():
+                return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/error")
+            await amark_verification_token_used(token)
+            return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/already-verified")
+
+        await amark_verification_token_used(token)
+        return HttpResponseRedirect(f"{settings.FRONTEND_URL}/verification/success")
@@ -0,0 +1,387 @@
+"""
+Micro and in-process load benchmarks for the accounts app.
+
+Run with `python manage.py benchmark [name ...]`. Every benchmark runs inside
+a transaction that is rolled back afterwards, so fixtures never persist.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register `func(iterations)` as a benchmark yielding result rows"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def measure(label, func, iterations):
+    """Call `func` `iterations` times and return a result row"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+    return row(label, iterations, elapsed, len(queries))
+
+
+def row(label, iterations, elapsed, queries=None, note=''):
+    return {
+        'label': label,
+        'iterations': iterations,
+        'seconds': elapsed,
+        'ops_per_sec': iterations / elapsed if elapsed else float('inf'),
+        'queries': queries,
+        'note': note,
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _create_user(email='bench@example.com'):
+    from django.contrib.auth import get_user_model
+    from .models import UserRegistrationInfo
+
+    user = get_user_model().objects.create_user(
+        email=email, username=email.split('@')[0], password='benchmark-password'
+    )
+    UserRegistrationInfo.objects.create(user=user, ip_address='127.0.0.1', user_agent='benchmark')
+    return user
+
+
+@benchmark('verify_replay')
+def verify_replay(iterations):
+    """Link storm: the same verification link clicked over and over"""
+    from urllib.parse import parse_qs, urlsplit
+
+    from .utils import _used_verification_token_key, generate_verification_link
+    from .views import VerifyEmailConfirmView
+
+    user = _create_user()
+    link = generate_verification_link(user)
+    path = link[link.index('/api/'):]
+    used_key = _used_verification_token_key(parse_qs(urlsplit(link).query)['token'][0])
+    view = VerifyEmailConfirmView.as_view()
+    factory = RequestFactory()
+
+    def click():
+        view(factory.get(path))
+
+    yield measure('first click', click, 1)
+    yield measure('replay (used-token set)', click, iterations)
+
+    def click_without_used_set():
+        # Only this link's entry: the cache may be shared with live traffic
+        cache.delete(used_key)
+        click()
+
+    yield measure('replay (database only)', click_without_used_set, iterations)
+
+
+@benchmark('wsgi_vs_asgi')
+def wsgi_vs_asgi(iterations):
+    """forgot-password throughput: WSGI threads vs ASGI with sync and async views"""
+    from .async_views import AsyncForgotPasswordView
+    from .views import ForgotPasswordView
+
+    path = '/api/forgot-password/'
+    # Both views answer an unknown address from the cached user_id_by_email entry
+    body = json.dumps({'email': 'nobody@example.com'})
+    sync_view = ForgotPasswordView.as_view()
+    async_view = AsyncForgotPasswordView.as_view()
+    factory = RequestFactory()
+    async_factory = AsyncRequestFactory()
+
+    def wsgi_request(_):
+        sync_view(factory.post(path, body, content_type='application/json'))
+
+    async def drive(concurrency, handler):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await handler(async_factory.post(path, body, content_type='application/json'))
+
+        await asyncio.gather(*(one() for _ in range(iterations)))
+
+    for concurrency in (16, 64, 256):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(wsgi_request, range(iterations)))
+        yield row(f'WSGI, sync view, {concurrency} threads', iterations, time.perf_counter() - started)
+
+        # What uvicorn does with a DRF view today
+        started = time.perf_counter()
+        asyncio.run(drive(concurrency, sync_to_async(sync_view)))
+        yield row(f'ASGI, sync view, {concurrency} tasks', iterations, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        asyncio.run(drive(concurrency, async_view))
+        yield row(f'ASGI, async view, {concurrency} tasks', iterations, time.perf_counter() - started)
+
+
+@benchmark('serialization')
+def serialization(iterations):
+    """Per-endpoint payload cost: serializers, stdlib vs orjson rendering and parsing"""
+    import io
+    from datetime import date, timedelta
+
+    from django.utils import timezone
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from .parsers import ORJSONParser
+    from .renderers import ORJSONRenderer
+    from .serializers import UserReadSerializer, UserSerializer
+
+    user = _create_user('serialization@example.com')
+    refresh = RefreshToken.for_user(user)
+    tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    funnel = {
+        'start': date.today() - timedelta(days=365),
+        'end': date.today(),
+        'days': [
+            {'day': date.today() - timedelta(days=i), 'registrations': 1000 + i, 'verified': 700 + i,
+             'conversion_rate': 0.7}
+            for i in range(365)
+        ],
+        'generated_at': timezone.now(),
+    }
+
+    yield measure('UserSerializer', lambda: UserSerializer(user).data, iterations)
+    yield measure('UserReadSerializer', lambda: UserReadSerializer(user).data, iterations)
+
+    payloads = {
+        'login': {**tokens, 'user': UserReadSerializer(user).data},
+        'profile': UserReadSerializer(user).data,
+        'registration-funnel (365 days)': funnel,
+    }
+    for endpoint, payload in payloads.items():
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            yield measure(
+                f'{endpoint}: {type(renderer).__name__}',
+                lambda: renderer.render(payload),
+                iterations,
+            )
+
+    body = JSONRenderer().render({'email': 'serialization@example.com', 'password': 'x' * 16})
+    for parser in (JSONParser(), ORJSONParser()):
+        yield measure(
+            f'login body: {type(parser).__name__}',
+            lambda: parser.parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'}),
+            iterations,
+        )
+
+
+@benchmark('admission_flood')
+def admission_flood(iterations):
+    """token/refresh latency on a 16-thread worker during a registration flood"""
+    from django.http import HttpResponse
+
+    from .middleware import AdmissionController, AdmissionControlMiddleware
+
+    # Simulated service times: hashing + SMTP for signups, a JWT decode for refresh
+    service_time = {'/api/register/': 0.05, '/api/token/refresh/': 0.002}
+    threads = 16
+    tick = 0.005
+    # 2 signups per tick is 1.25x what the worker can serve
+    registrations_per_tick = 2
+    factory = RequestFactory()
+
+    def view(request):
+        time.sleep(service_time[request.path])
+        return HttpResponse()
+
+    for enabled in (False, True):
+        controller = AdmissionController({
+            'ENABLED': enabled,
+            'MAX_IN_FLIGHT': threads,
+            'QUEUE_TIMEOUT': 0.01,
+        })
+        handler = AdmissionControlMiddleware(view, controller)
+        latencies = []
+
+        def call(path, submitted):
+            handler(factory.post(path))
+            if path == '/api/token/refresh/':
+                latencies.append(time.perf_counter() - submitted)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            for i in range(iterations):
+                for _ in range(registrations_per_tick):
+                    pool.submit(call, '/api/register/', time.perf_counter())
+                pool.submit(call, '/api/token/refresh/', time.perf_counter())
+                time.sleep(max(0, started + (i + 1) * tick - time.perf_counter()))
+        elapsed = time.perf_counter() - started
+
+        stats = controller.snapshot()
+        yield row(
+            f'refresh, admission control {"on" if enabled else "off"}',
+            iterations,
+            elapsed,
+            note=(
+                f'p50 {percentile(latencies, 0.5) * 1000:.1f}ms '
+                f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms, '
+                f'{stats["shed"]["low"]} signups shed'
+            ),
+        )
+
+
+@benchmark('client_ip')
+def client_ip(iterations):
+    """Resolving the client address behind two proxies, cached and uncached"""
+    import ipaddress
+
+    from .client_ip import ClientIPResolver
+
+    trusted = [f'10.{i}.0.0/16' for i in range(50)] + ['2001:db8::/32']
+    resolver = ClientIPResolver(trusted)
+    meta = ('10.0.0.1', '203.0.113.9, 10.1.2.3')
+    networks = [ipaddress.ip_network(cidr) for cidr in trusted]
+
+    def linear_scan():
+        # What a plain `any(ip in network ...)` walk costs per hop
+        for hop in reversed(meta[1].split(',')):
+            ip = ipaddress.ip_address(hop.strip())
+            if not any(ip in network for network in networks if network.version == ip.version):
+                return ip
+
+    yield measure('linear network scan', linear_scan, iterations)
+    yield measure('prefix sets, uncached', lambda: resolver._resolve(*meta), iterations)
+    yield measure('prefix sets, cached', lambda: resolver.resolve(*meta), iterations)
+
+
+@benchmark('verification_tokens')
+def verification_tokens(iterations):
+    """Verification link encode/decode: signing.dumps(compress=True) vs the codec"""
+    from django.conf import settings
+    from django.core import signing
+    from django.urls import reverse
+
+    from .verification_tokens import (
+        VERIFICATION_MAX_AGE,
+        VERIFICATION_SALT,
+        build_verification_link,
+        decode_verification_token,
+        encode_verification_token,
+    )
+
+    class User:
+        id = 123456
+        email = 'verification.benchmark@example.com'
+
+    user = User()
+    data = {'user_id': user.id, 'email': user.email}
+
+    def legacy_link():
+        token = signing.dumps(data, salt=VERIFICATION_SALT, compress=True)
+        return f"{settings.BACKEND_URL}{reverse('verify-email-confirm')}?token={token}"
+
+    legacy_token = signing.dumps(data, salt=VERIFICATION_SALT, compress=True)
+    token = encode_verification_token(user.id, user.email)
+
+    yield measure('encode: signing.dumps + reverse', legacy_link, iterations)
+    yield measure('encode: codec', lambda: build_verification_link(user), iterations)
+    yield measure(
+        'decode: signing.loads',
+        lambda: signing.loads(legacy_token, salt=VERIFICATION_SALT, max_age=VERIFICATION_MAX_AGE),
+        iterations,
+    )
+    yield measure('decode: codec', lambda: decode_verification_token(token), iterations)
+    yield measure('decode: codec, legacy token', lambda: decode_verification_token(legacy_token), iterations)
+
+
+@benchmark('query_plans')
+def query_plans(iterations):
+    """Hot account queries against the current (seeded) PostgreSQL database"""
+    from .query_plans import HOT_QUERIES, check, sample_values
+
+    if connection.vendor != 'postgresql':
+        yield row('skipped: needs PostgreSQL', 0, 0.0, note='seed with generate_synthetic_data first')
+        return
+
+    sample = sample_values()
+    for query in HOT_QUERIES:
+        result = check(query, sample)
+        measured = measure(query.name, lambda: query.run(sample), iterations)
+        measured['note'] = f"{result['buffers']} buffers via {', '.join(result['indexes']) or 'no index'}"
+        if result['problems']:
+            measured['note'] += ' PROBLEMS: ' + '; '.join(result['problems'])
+        yield measured
+
+
+@benchmark('tiered_cache')
+def tiered_cache(iterations):
+    """Hot-key lookups through the shared cache alone vs the tiered cache, and a miss stampede"""
+    import threading
+
+    from .tiered_cache import REGISTRY, TieredCache
+
+    payload = {
+        'id': 123456,
+        'email': 'cache.benchmark@example.com',
+        'username': 'cachebenchmark',
+        'is_email_verified': True,
+        'created_at': '2024-01-01T00:00:00Z',
+    }
+    shared_only = TieredCache('benchmark-shared-only', l1_size=0)
+    tiered = TieredCache('benchmark-tiered')
+    cache.set('benchmark:plain', payload, 300)
+
+    yield measure('shared cache get()', lambda: cache.get('benchmark:plain'), iterations)
+    yield measure('tiered, L1 disabled', lambda: shared_only.get_or_load('hot', lambda: payload), iterations)
+    yield measure('tiered, L1 enabled', lambda: tiered.get_or_load('hot', lambda: payload), iterations)
+
+    # 32 threads miss the same key at once; the loader takes 20ms
+    def stampede(get):
+        loads = []
+        barrier = threading.Barrier(32)
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.02)
+            return payload
+
+        def reader():
+            barrier.wait()
+            get(loader)
+
+        threads = [threading.Thread(target=reader) for _ in range(32)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, len(loads)
+
+    def unprotected(loader):
+        value = cache.get('benchmark:stampede')
+        if value is None:
+            value = loader()
+            cache.set('benchmark:stampede', value, 300)
+        return value
+
+    elapsed, loads = stampede(unprotected)
+    yield row('stampede, get/set', 32, elapsed, note=f'{loads} loads')
+    elapsed, loads = stampede(lambda loader: tiered.get_or_load('stampede', loader))
+    yield row('stampede, single-flight', 32, elapsed, note=f'{loads} loads')
+
+    for name in ('benchmark-shared-only', 'benchmark-tiered'):
+        REGISTRY.pop(name, None)
+    cache.delete_many(['benchmark:plain', 'benchmark:stampede'])
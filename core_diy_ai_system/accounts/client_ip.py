@@ -0,0 +1,106 @@
+"""
+Client IP resolution behind reverse proxies.
+
+X-Forwarded-For is only believed as far as it was written by proxies we
+trust: the chain is walked from the right, starting at REMOTE_ADDR, and the
+first address that is not in TRUSTED_PROXIES is the client. Anything to the
+left of it was supplied by the client and is ignored, so IP-keyed lockouts
+and throttles cannot be dodged by sending a forged header. A request with
+no usable address at all resolves to UNKNOWN_IP, so it can still be stored
+in the NOT NULL ip_address columns.
+"""
+import functools
+import ipaddress
+
+from django.conf import settings
+from django.utils.functional import cached_property
+
+DEFAULT_TRUSTED_PROXIES = ('127.0.0.1/32', '::1/128')
+UNKNOWN_IP = '0.0.0.0'
+
+
+def normalize_ip(value):
+    """
+    Canonical form of an address taken from a header, or None if invalid.
+
+    Accepts `[v6]:port`, `v4:port` and IPv4-mapped IPv6 addresses, and returns
+    compressed lower-case IPv6 so that one client always maps to one key.
+    """
+    value = value.strip()
+    if value.startswith('['):
+        value = value[1:value.find(']')]
+    elif value.count(':') == 1:
+        value = value.split(':', 1)[0]
+    try:
+        ip = ipaddress.ip_address(value.split('%', 1)[0])
+    except ValueError:
+        return None
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip
+
+
+class ClientIPResolver:
+    """
+    Walks X-Forwarded-For against a set of trusted proxy networks.
+
+    The networks are precomputed into `{version: [(netmask, {network int})]}`,
+    so checking an address is one mask and set lookup per distinct prefix
+    length. Resolved addresses are memoized per (REMOTE_ADDR,
+    X-Forwarded-For) pair, which repeats heavily behind a load balancer.
+    """
+
+    def __init__(self, trusted_proxies=None, cache_size=4096):
+        self._trusted_proxies = trusted_proxies
+        self.resolve = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    @cached_property
+    def trusted_networks(self):
+        proxies = self._trusted_proxies
+        if proxies is None:
+            proxies = getattr(settings, 'TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES)
+
+        by_length = {4: {}, 6: {}}
+        for proxy in proxies:
+            # Tolerate the empty entries a trailing comma leaves in the setting
+            if not proxy.strip():
+                continue
+            network = ipaddress.ip_network(proxy.strip(), strict=False)
+            by_length[network.version].setdefault(network.netmask, set()).add(int(network.network_address))
+        return {
+            version: [(int(netmask), prefixes) for netmask, prefixes in networks.items()]
+            for version, networks in by_length.items()
+        }
+
+    def is_trusted(self, ip):
+        value = int(ip)
+        for mask, prefixes in self.trusted_networks[ip.version]:
+            if value & mask in prefixes:
+                return True
+        return False
+
+    def _resolve(self, remote_addr, forwarded_for):
+        remote = normalize_ip(remote_addr or '')
+        # A unix-socket peer (no address) is the local proxy
+        if remote is not None and not self.is_trusted(remote):
+            return remote.compressed
+        if not forwarded_for:
+            return remote.compressed if remote is not None else UNKNOWN_IP
+
+        client = remote
+        for hop in reversed(forwarded_for.split(',')):
+            ip = normalize_ip(hop)
+            if ip is None:
+                # Garbage written by the client; the last hop a trusted
+                # proxy vouched for is as far as we can go
+                break
+            client = ip
+            if not self.is_trusted(ip):
+                break
+        return client.compressed if client is not None else UNKNOWN_IP
+
+    def __call__(self, request):
+        return self.resolve(request.META.get('REMOTE_ADDR'), request.META.get('HTTP_X_FORWARDED_FOR'))
+
+
+get_client_ip = ClientIPResolver()
@@ -0,0 +1,61 @@
+"""
+Failed-login accounting.
+
+Failures are counted in FailedLoginCounter rows keyed by (email, ip_address,
+bucket) with a single `INSERT ... ON CONFLICT DO UPDATE SET count = count + 1`,
+so a credential-stuffing run against one account from one address adds one
+row per BUCKET_SECONDS instead of one row per guess. Individual events can
+additionally be written to an append-only log file for forensics by setting
+FAILED_LOGIN_LOG_FILE (see the LOGGING setting).
+"""
+import datetime
+import json
+import logging
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import FailedLoginCounter
+
+BUCKET_SECONDS = 5 * 60
+
+event_log = logging.getLogger('accounts.failed_logins')
+
+
+def normalize_email(email):
+    return str(email).strip().lower()[:254]
+
+
+def bucket_start(moment):
+    epoch = int(moment.timestamp())
+    return datetime.datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=datetime.timezone.utc)
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(FailedLoginCounter._meta.db_table)
+    return (
+        f'INSERT INTO {table} (email, ip_address, bucket, count) VALUES (%s, %s, %s, 1) '
+        f'ON CONFLICT (email, ip_address, bucket) DO UPDATE SET count = {table}.count + 1'
+    )
+
+
+def record_failed_login(email, ip_address):
+    """Count one failed login against its (email, ip, bucket) row"""
+    now = timezone.now()
+    email = normalize_email(email)
+    with connection.cursor() as cursor:
+        cursor.execute(_upsert_sql(), [email, ip_address, bucket_start(now)])
+
+    if event_log.isEnabledFor(logging.INFO):
+        event_log.info(json.dumps({'at': now.isoformat(), 'email': email, 'ip': ip_address}))
+
+
+def failures_since(since, email=None, ip_address=None):
+    """Failed logins recorded since `since` for an email and/or IP address"""
+    counters = FailedLoginCounter.objects.filter(bucket__gte=bucket_start(since))
+    if email is not None:
+        counters = counters.filter(email=normalize_email(email))
+    if ip_address is not None:
+        counters = counters.filter(ip_address=ip_address)
+    return counters.aggregate(total=Sum('count'))['total'] or 0
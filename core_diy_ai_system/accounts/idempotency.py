@@ -0,0 +1,190 @@
+"""
+Idempotency-Key support for the accounts POST endpoints.
+
+The first request carrying a given key runs normally and its response is
+stored in the cache for IDEMPOTENCY_TTL seconds together with a fingerprint
+of the request. Retries with the same key and body get the stored response
+back without redoing the work; a concurrent duplicate waits briefly for the
+first request to finish instead of running in parallel, then gets 409.
+Reusing a key for a different request is rejected with 422. `debug_info` is
+never stored, so the reset and verification links it carries under DEBUG are
+not handed to whoever replays the key.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import time
+import uuid
+
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TTL = 24 * 60 * 60
+# How long a request may hold a key, and how long a duplicate waits for it.
+# A waiting sync request ties up a worker thread, so it gives up sooner.
+LOCK_TIMEOUT = 60
+WAIT_TIMEOUT = 15
+SYNC_WAIT_TIMEOUT = 0.5
+POLL_INTERVAL = 0.05
+UNSTORED_FIELDS = ('debug_info',)
+
+MISMATCH_DETAIL = 'Idempotency-Key has already been used for a different request.'
+IN_PROGRESS_DETAIL = 'A request with this Idempotency-Key is still being processed.'
+INVALID_DETAIL = 'Idempotency-Key must be between 1 and 255 characters.'
+
+
+class IdempotentRequest:
+    def __init__(self, key, request):
+        scope = hashlib.sha256(f'{request.path}\n{key}'.encode()).hexdigest()
+        self.cache_key = f'idempotency:{scope}'
+        self.lock_key = f'idempotency:{scope}:lock'
+        # Identifies this request's hold on lock_key
+        self.lock_token = uuid.uuid4().hex
+        self.fingerprint = hashlib.sha256(
+            request.method.encode() + b'\n' + request.body
+        ).hexdigest()
+
+    def check(self, stored):
+        """'replay', 'mismatch' or None for a stored entry"""
+        if stored is None:
+            return None
+        return 'replay' if stored['fingerprint'] == self.fingerprint else 'mismatch'
+
+    def entry(self, status_code, **payload):
+        return {'fingerprint': self.fingerprint, 'status': status_code, **payload}
+
+    def release(self):
+        # Only drop the lock if it is still ours; after LOCK_TIMEOUT it may
+        # belong to a duplicate that started since
+        if cache.get(self.lock_key) == self.lock_token:
+            cache.delete(self.lock_key)
+
+    async def arelease(self):
+        if await cache.aget(self.lock_key) == self.lock_token:
+            await cache.adelete(self.lock_key)
+
+
+def _storable(data):
+    if isinstance(data, dict):
+        return {name: value for name, value in data.items() if name not in UNSTORED_FIELDS}
+    return data
+
+
+def _storable_content(content, content_type):
+    if not content_type.startswith('application/json'):
+        return content
+    return json.dumps(_storable(json.loads(content))).encode()
+
+
+def _key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    return key if 0 < len(key) <= 255 else ''
+
+
+def _stored_response(outcome, stored):
+    if outcome == 'mismatch':
+        return Response({'detail': MISMATCH_DETAIL}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(handler):
+    """Honour Idempotency-Key headers on an APIView's `post` handler"""
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = _key(request)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key:
+            return Response({'detail': INVALID_DETAIL}, status=status.HTTP_400_BAD_REQUEST)
+
+        idempotent_request = IdempotentRequest(key, request._request)
+        deadline = time.monotonic() + SYNC_WAIT_TIMEOUT
+        while True:
+            stored = cache.get(idempotent_request.cache_key)
+            outcome = idempotent_request.check(stored)
+            if outcome:
+                return _stored_response(outcome, stored)
+            if cache.add(idempotent_request.lock_key, idempotent_request.lock_token, timeout=LOCK_TIMEOUT):
+                break
+            if time.monotonic() >= deadline:
+                return Response({'detail': IN_PROGRESS_DETAIL}, status=status.HTTP_409_CONFLICT)
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            # An entry written while we waited for the lock wins
+            stored = cache.get(idempotent_request.cache_key)
+            outcome = idempotent_request.check(stored)
+            if outcome:
+                return _stored_response(outcome, stored)
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(
+                    idempotent_request.cache_key,
+                    idempotent_request.entry(response.status_code, data=_storable(response.data)),
+                    timeout=IDEMPOTENCY_TTL
+                )
+            return response
+        finally:
+            idempotent_request.release()
+    return wrapper
+
+
+def _stored_json_response(outcome, stored):
+    if outcome == 'mismatch':
+        return JsonResponse({'detail': MISMATCH_DETAIL}, status=422)
+    response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def aidempotent(handler):
+    """Async counterpart of `idempotent` for `async def post` handlers"""
+    @functools.wraps(handler)
+    async def wrapper(view, request, *args, **kwargs):
+        key = _key(request)
+        if key is None:
+            return await handler(view, request, *args, **kwargs)
+        if not key:
+            return JsonResponse({'detail': INVALID_DETAIL}, status=400)
+
+        idempotent_request = IdempotentRequest(key, request)
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            stored = await cache.aget(idempotent_request.cache_key)
+            outcome = idempotent_request.check(stored)
+            if outcome:
+                return _stored_json_response(outcome, stored)
+            if await cache.aadd(idempotent_request.lock_key, idempotent_request.lock_token, timeout=LOCK_TIMEOUT):
+                break
+            if time.monotonic() >= deadline:
+                return JsonResponse({'detail': IN_PROGRESS_DETAIL}, status=409)
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            stored = await cache.aget(idempotent_request.cache_key)
+            outcome = idempotent_request.check(stored)
+            if outcome:
+                return _stored_json_response(outcome, stored)
+
+            response = await handler(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                await cache.aset(
+                    idempotent_request.cache_key,
+                    idempotent_request.entry(
+                        response.status_code,
+                        content=_storable_content(response.content, response['Content-Type']),
+                        content_type=response['Content-Type'],
+                    ),
+                    timeout=IDEMPOTENCY_TTL
+                )
+            return response
+        finally:
+            await idempotent_request.arelease()
+    return wrapper
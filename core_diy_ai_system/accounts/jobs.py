@@ -0,0 +1,267 @@
+"""
+Database-backed background jobs.
+
+Jobs are rows in `background_job`. Workers (`manage.py run_jobs`) claim ready
+rows with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of worker
+processes can poll the same table without handing out a job twice, mark them
+running, and execute them outside the claiming transaction. Failed jobs are
+retried with exponential backoff up to `max_attempts`. While a job runs the
+worker renews its heartbeat every HEARTBEAT_INTERVAL; a job whose heartbeat
+is older than STALE_AFTER lost its worker and is handed out again, or marked
+failed once it has used up its attempts, so a job that crashes its worker
+is not retried forever.
+
+Register a job with `@job('name')` and enqueue it with
+`enqueue('name', {...})` or `func.enqueue({...})`. `@periodic_job('name',
+every=timedelta(...))` jobs re-enqueue themselves after each run; workers
+create the first run on startup.
+"""
+import contextlib
+import functools
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+STALE_AFTER = timedelta(minutes=5)
+RETRY_BASE_DELAY = timedelta(seconds=10)
+DONE_RETENTION = timedelta(days=7)
+
+REGISTRY = {}
+PERIODIC = {}
+
+
+def job(name, queue='default', max_attempts=3):
+    """Register `func(**payload)` as the handler for jobs called `name`"""
+    def decorator(func):
+        REGISTRY[name] = func
+        func.job_name = name
+        func.enqueue = functools.partial(enqueue, name, queue=queue, max_attempts=max_attempts)
+        func.enqueue_many = functools.partial(enqueue_many, name, queue=queue, max_attempts=max_attempts)
+        return func
+    return decorator
+
+
+def periodic_job(name, every, queue='default'):
+    """Register a job that runs every `every` (a timedelta) without payload"""
+    def decorator(func):
+        job(name, queue=queue, max_attempts=1)(func)
+        PERIODIC[name] = (every, queue)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, *, queue='default', run_at=None, delay=None,
+            max_attempts=3, unique_key=None):
+    """
+    Add a job; returns the Job, or None if `unique_key` is already pending.
+
+    Inside a transaction the job becomes visible to workers when it commits.
+    """
+    if name not in REGISTRY:
+        raise KeyError(f'Unknown job {name!r}')
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                queue=queue,
+                payload=payload or {},
+                run_at=run_at,
+                max_attempts=max_attempts,
+                unique_key=unique_key,
+            )
+    except IntegrityError:
+        if unique_key is None:
+            raise
+        return None
+
+
+def enqueue_many(name, payloads, *, queue='default', max_attempts=3):
+    """Add one job per payload with a single INSERT; returns the Jobs"""
+    if name not in REGISTRY:
+        raise KeyError(f'Unknown job {name!r}')
+    run_at = timezone.now()
+    return Job.objects.bulk_create([
+        Job(name=name, queue=queue, payload=payload, run_at=run_at, max_attempts=max_attempts)
+        for payload in payloads
+    ])
+
+
+def ensure_periodic_jobs():
+    """Queue the next run of every periodic job that has none pending"""
+    for name, (every, queue) in PERIODIC.items():
+        enqueue(name, queue=queue, max_attempts=1, unique_key=f'periodic:{name}')
+
+
+def claim(queues, limit=1):
+    """Mark up to `limit` ready jobs from `queues` as running and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        ready = (
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, queue__in=queues, run_at__lte=now, attempts__lt=F('max_attempts'))
+            .order_by('run_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        pks = list(ready)
+        if not pks:
+            return []
+        Job.objects.filter(pk__in=pks).update(
+            status=Job.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(pk__in=pks).order_by('run_at'))
+
+
+def run(claimed):
+    """Execute one claimed job and record the outcome"""
+    handler = REGISTRY.get(claimed.name)
+    try:
+        if handler is None:
+            raise KeyError(f'No handler registered for job {claimed.name!r}')
+        with heartbeat(claimed.pk):
+            handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s failed (attempt %s)', claimed, claimed.attempts)
+        failed = Job.objects.filter(pk=claimed.pk)
+        if claimed.attempts < claimed.max_attempts:
+            failed.update(
+                status=Job.QUEUED,
+                run_at=timezone.now() + RETRY_BASE_DELAY * 2 ** (claimed.attempts - 1),
+                last_error=error,
+            )
+        else:
+            failed.update(status=Job.FAILED, last_error=error, finished_at=timezone.now())
+            # A periodic job that exhausted its attempts still gets its next run
+            _reschedule(claimed)
+        return False
+
+    with transaction.atomic():
+        Job.objects.filter(pk=claimed.pk).update(status=Job.DONE, finished_at=timezone.now())
+        _reschedule(claimed)
+    return True
+
+
+def _reschedule(claimed):
+    if claimed.name in PERIODIC:
+        every, queue = PERIODIC[claimed.name]
+        enqueue(
+            claimed.name,
+            queue=queue,
+            run_at=claimed.started_at + every,
+            max_attempts=1,
+            unique_key=f'periodic:{claimed.name}',
+        )
+
+
+@contextlib.contextmanager
+def heartbeat(pk, interval=HEARTBEAT_INTERVAL):
+    """Renew the heartbeat of running job `pk` from a thread until the block exits"""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval.total_seconds()):
+                Job.objects.filter(pk=pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'job-{pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def requeue_stale():
+    """
+    Hand out again jobs whose worker stopped renewing their heartbeat, or
+    fail them if they have no attempts left; returns how many were requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - STALE_AFTER)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        finished_at=now,
+        last_error='Worker stopped while running the job',
+    )
+    return stale.filter(attempts__lt=F('max_attempts')).update(status=Job.QUEUED, run_at=now)
+
+
+def work(queues, batch_size=1, stop=lambda: False):
+    """Claim and run jobs until none are ready; returns how many ran"""
+    ran = 0
+    while not stop():
+        claimed = claim(queues, batch_size)
+        if not claimed:
+            break
+        for claimed_job in claimed:
+            run(claimed_job)
+            ran += 1
+    return ran
+
+
+def queue_stats(window=timedelta(hours=1)):
+    """
+    Per-queue depth and latency.
+
+    `ready` jobs are due and waiting for a worker, `oldest_ready_seconds` is
+    how long the longest of them has waited, and `avg_wait_seconds` is the
+    mean time between run_at and a worker picking the job up over `window`.
+    """
+    now = timezone.now()
+    stats = {}
+    by_status = Job.objects.values('queue').annotate(
+        ready=Count('pk', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+        scheduled=Count('pk', filter=Q(status=Job.QUEUED, run_at__gt=now)),
+        running=Count('pk', filter=Q(status=Job.RUNNING)),
+        failed=Count('pk', filter=Q(status=Job.FAILED)),
+        oldest_ready=Min('run_at', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+    ).order_by('queue')
+    for row in by_status:
+        oldest = row.pop('oldest_ready')
+        row['oldest_ready_seconds'] = round((now - oldest).total_seconds(), 3) if oldest else 0.0
+        stats[row.pop('queue')] = row
+
+    # Retried jobs are excluded: their run_at already points at the next attempt
+    waits = Job.objects.filter(started_at__gte=now - window).exclude(status=Job.QUEUED).values('queue').annotate(
+        avg_wait=Avg(F('started_at') - F('run_at')),
+        started=Count('pk'),
+    ).order_by('queue')
+    for row in waits:
+        queue_row = stats.setdefault(row['queue'], {})
+        queue_row['started_last_window'] = row['started']
+        avg_wait = row['avg_wait']
+        if avg_wait is not None and not isinstance(avg_wait, timedelta):
+            # SQLite returns microseconds
+            avg_wait = timedelta(microseconds=avg_wait)
+        queue_row['avg_wait_seconds'] = round(avg_wait.total_seconds(), 3) if avg_wait else 0.0
+    return stats
+
+
+def purge_finished(older_than=DONE_RETENTION):
+    cutoff = timezone.now() - older_than
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def close_connections():
+    """Called before forking so children do not share a database socket"""
+    connections.close_all()
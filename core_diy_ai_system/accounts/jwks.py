@@ -0,0 +1,178 @@
+"""
+Asymmetric JWT signing with key rotation.
+
+When JWT_KEYS_DIR is set, every `<kid>.pem` private key (RSA or Ed25519) in
+that directory is loaded once per process. Tokens are signed with the active
+key (JWT_ACTIVE_KID, or the last file name in sort order) and carry its
+`kid` header; tokens signed with any key still in the directory verify, and
+all public keys are published as a JWKS document so other services can
+verify access tokens without calling this backend.
+
+HS256 tokens without a `kid`, issued with SECRET_KEY before the switch, are
+rejected unless JWT_LEGACY_CUTOVER names the time of the switch; then those
+issued before it are accepted for REFRESH_TOKEN_LIFETIME after it, and no
+longer.
+"""
+import functools
+import hashlib
+import json
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+
+def jwt_keys_enabled():
+    return bool(getattr(settings, 'JWT_KEYS_DIR', None))
+
+
+def _algorithm_for(key):
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if isinstance(key, rsa.RSAPrivateKey):
+        return 'RS256'
+    if isinstance(key, ed25519.Ed25519PrivateKey):
+        return 'EdDSA'
+    raise ImproperlyConfigured(f'Unsupported JWT signing key type: {type(key).__name__}')
+
+
+@functools.lru_cache(maxsize=None)
+def get_signing_keys():
+    """{kid: (algorithm, private key)} for every key in JWT_KEYS_DIR"""
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+    keys = {}
+    for path in sorted(Path(settings.JWT_KEYS_DIR).glob('*.pem')):
+        private_key = load_pem_private_key(path.read_bytes(), password=None)
+        keys[path.stem] = (_algorithm_for(private_key), private_key)
+    if not keys:
+        raise ImproperlyConfigured(f'No *.pem keys found in JWT_KEYS_DIR ({settings.JWT_KEYS_DIR})')
+    return keys
+
+
+def get_active_kid():
+    keys = get_signing_keys()
+    kid = getattr(settings, 'JWT_ACTIVE_KID', None) or list(keys)[-1]
+    if kid not in keys:
+        raise ImproperlyConfigured(f'JWT_ACTIVE_KID {kid!r} is not a key in JWT_KEYS_DIR')
+    return kid
+
+
+def legacy_cutover():
+    """When asymmetric signing was enabled (JWT_LEGACY_CUTOVER), or None"""
+    value = getattr(settings, 'JWT_LEGACY_CUTOVER', None)
+    if not value:
+        return None
+    cutover = parse_datetime(value) if isinstance(value, str) else value
+    if cutover is None:
+        raise ImproperlyConfigured(f'JWT_LEGACY_CUTOVER {value!r} is not an ISO 8601 datetime')
+    if timezone.is_naive(cutover):
+        cutover = timezone.make_aware(cutover, dt_timezone.utc)
+    return cutover
+
+
+@functools.lru_cache(maxsize=None)
+def get_jwks_document():
+    """Serialized JWKS document and its ETag"""
+    from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+    jwks = []
+    for kid, (algorithm, private_key) in get_signing_keys().items():
+        exporter = RSAAlgorithm if algorithm == 'RS256' else OKPAlgorithm
+        jwk = exporter.to_jwk(private_key.public_key(), as_dict=True)
+        jwk.update({'kid': kid, 'alg': algorithm, 'use': 'sig'})
+        jwks.append(jwk)
+    body = json.dumps({'keys': jwks}, separators=(',', ':')).encode()
+    return body, '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+class KeyRotatingTokenBackend(TokenBackend):
+    """
+    simplejwt TokenBackend that signs with the active key and picks the
+    verifying key from the token's `kid` header.
+
+    Tokens without a `kid` were issued before asymmetric signing was
+    enabled. They are verified under SIMPLE_JWT's HS256 settings, and only
+    while JWT_LEGACY_CUTOVER allows it.
+    """
+
+    def __init__(self):
+        super().__init__(
+            api_settings.ALGORITHM,
+            api_settings.SIGNING_KEY,
+            api_settings.VERIFYING_KEY,
+            api_settings.AUDIENCE,
+            api_settings.ISSUER,
+            None,
+            api_settings.LEEWAY,
+            api_settings.JSON_ENCODER,
+        )
+        self.keys = get_signing_keys()
+        self.active_kid = get_active_kid()
+        self.legacy_cutover = legacy_cutover()
+        self.public_keys = {
+            kid: (algorithm, private_key.public_key())
+            for kid, (algorithm, private_key) in self.keys.items()
+        }
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        algorithm, private_key = self.keys[self.active_kid]
+        return jwt.encode(
+            jwt_payload,
+            private_key,
+            algorithm=algorithm,
+            headers={'kid': self.active_kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+        if kid is None:
+            return self.decode_legacy(token, verify)
+        if kid not in self.public_keys:
+            raise TokenBackendError(_('Token is invalid or expired'))
+
+        algorithm, public_key = self.public_keys[kid]
+        try:
+            return jwt.decode(
+                token,
+                public_key,
+                algorithms=[algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+
+    def decode_legacy(self, token, verify):
+        cutover = self.legacy_cutover
+        if cutover is None or timezone.now() > cutover + api_settings.REFRESH_TOKEN_LIFETIME:
+            raise TokenBackendError(_('Token is invalid or expired'))
+        payload = super().decode(token, verify=verify)
+        # A SECRET_KEY token minted after the cutover cannot be legitimate
+        issued_at = payload.get('iat')
+        if not isinstance(issued_at, (int, float)) or issued_at > cutover.timestamp() + self.get_leeway().total_seconds():
+            raise TokenBackendError(_('Token is invalid or expired'))
+        return payload
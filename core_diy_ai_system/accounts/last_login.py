@@ -0,0 +1,76 @@
+import atexit
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Case, DateTimeField, Value, When
+
+
+class LastLoginBuffer:
+    """
+    Collect `last_login` timestamps in memory and write them in batches.
+
+    Used instead of simplejwt's UPDATE_LAST_LOGIN, which costs one UPDATE of
+    the user row per login. Pending timestamps are flushed by a timer thread
+    every `flush_interval` seconds, as soon as `max_pending` users are queued,
+    and at interpreter exit.
+    """
+
+    def __init__(self, flush_interval=30, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def record(self, user_id, when):
+        with self._lock:
+            self._pending[user_id] = when
+            full = len(self._pending) >= self.max_pending
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread owns its own database connection
+            connections.close_all()
+
+    def flush(self):
+        """Write all pending timestamps; returns the number of users updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        User = get_user_model()
+        items = list(pending.items())
+        for start in range(0, len(items), self.max_pending):
+            batch = items[start:start + self.max_pending]
+            try:
+                User.objects.filter(pk__in=[user_id for user_id, _ in batch]).update(
+                    last_login=Case(
+                        *[When(pk=user_id, then=Value(when)) for user_id, when in batch],
+                        output_field=DateTimeField(),
+                    )
+                )
+            except Exception:
+                # Keep what was not written for the next flush, unless a
+                # newer login was recorded meanwhile
+                with self._lock:
+                    for user_id, when in items[start:]:
+                        self._pending.setdefault(user_id, when)
+                raise
+        return len(items)
+
+
+last_login_buffer = LastLoginBuffer()
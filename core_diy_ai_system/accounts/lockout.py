@@ -0,0 +1,211 @@
+import hashlib
+import ipaddress
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .tiered_cache import LocalCache
+
+DEFAULTS = {
+    # Failures within WINDOW before each scope is locked
+    'ACCOUNT_THRESHOLD': 5,
+    'IP_THRESHOLD': 20,
+    'NETWORK_THRESHOLD': 100,
+    # First lockout lasts BASE_DELAY seconds and doubles with every further
+    # failure, up to MAX_DELAY
+    'BASE_DELAY': 60,
+    'MAX_DELAY': 24 * 60 * 60,
+    'WINDOW': 24 * 60 * 60,
+    # Networks whose failures are aggregated to catch distributed attacks
+    'IPV4_PREFIX': 24,
+    'IPV6_PREFIX': 64,
+}
+
+
+class LockoutEngine:
+    """
+    Exponential-backoff lockouts per account, per IP and per network.
+
+    All state lives in the cache: one integer failure counter and one
+    lock-expiry timestamp per scope. Checking whether a login may proceed is a
+    single `get_many` and never touches the database or the password hasher.
+
+    `history(since, email=None, ip_address=None)`, if given, returns failures
+    persisted elsewhere; it seeds account and IP counters that are missing
+    from the cache (cold start, eviction) so a cache flush does not hand
+    attackers a fresh budget.
+
+    `local`, a LocalCache, keeps the locks this process has seen until they
+    expire, so requests from a locked-out client are refused without a cache
+    round trip. Locks only ever get longer while they last, so a local copy
+    can end early but never lets a request through too soon.
+    """
+
+    def __init__(self, cache=cache, history=None, local=None):
+        self.cache = cache
+        self.history = history
+        self.local = local
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'ACCOUNT_LOCKOUT', {})}
+
+    def scopes(self, email, ip_address, config):
+        """(key suffix, threshold) for every scope the attempt counts against"""
+        email_digest = hashlib.sha1(str(email).strip().lower().encode()).hexdigest()[:20]
+        scopes = [('a:' + email_digest, config['ACCOUNT_THRESHOLD'])]
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return scopes
+        if ip.is_unspecified:
+            # UNKNOWN_IP is shared by every client without an address
+            return scopes
+        prefix = config['IPV4_PREFIX'] if ip.version == 4 else config['IPV6_PREFIX']
+        network = ipaddress.ip_network(f'{ip}/{prefix}', strict=False)
+        scopes.append(('i:' + ip.compressed, config['IP_THRESHOLD']))
+        scopes.append(('n:' + network.compressed, config['NETWORK_THRESHOLD']))
+        return scopes
+
+    def retry_after(self, email, ip_address):
+        """Seconds until a login for `email` from `ip_address` is allowed, 0 if now"""
+        keys = [f'lockout:lock:{scope}' for scope, _ in self.scopes(email, ip_address, self.config)]
+        locks = self._local_locks(keys)
+        if not locks:
+            locks = self.cache.get_many(keys)
+            self._remember(locks)
+        return self._remaining(locks)
+
+    async def aretry_after(self, email, ip_address):
+        keys = [f'lockout:lock:{scope}' for scope, _ in self.scopes(email, ip_address, self.config)]
+        locks = self._local_locks(keys)
+        if not locks:
+            locks = await self.cache.aget_many(keys)
+            self._remember(locks)
+        return self._remaining(locks)
+
+    def _local_locks(self, keys):
+        if self.local is None:
+            return {}
+        now = time.time()
+        locks = {key: self.local.get(key) for key in keys}
+        return {key: until for key, until in locks.items() if until is not None and until > now}
+
+    def _remember(self, locks):
+        if self.local is not None:
+            now = time.time()
+            for key, until in locks.items():
+                if until > now:
+                    self.local.set(key, until, ttl=until - now)
+
+    @staticmethod
+    def _remaining(locks):
+        if not locks:
+            return 0
+        return max(0, int(max(locks.values()) - time.time()))
+
+    def _history_filter(self, scope, email, ip_address):
+        if scope.startswith('a:'):
+            return {'email': email}
+        if scope.startswith('i:'):
+            return {'ip_address': ip_address}
+        return None
+
+    def _seed(self, counter_key, scope, email, ip_address, config):
+        """Starting value for a counter: 0, or recorded history if it is missing"""
+        filters = self._history_filter(scope, email, ip_address)
+        if self.history is None or filters is None or self.cache.get(counter_key) is not None:
+            return 0
+        return self.history(timezone.now() - timedelta(seconds=config['WINDOW']), **filters)
+
+    async def _aseed(self, counter_key, scope, email, ip_address, config):
+        filters = self._history_filter(scope, email, ip_address)
+        if self.history is None or filters is None or await self.cache.aget(counter_key) is not None:
+            return 0
+        since = timezone.now() - timedelta(seconds=config['WINDOW'])
+        return await sync_to_async(self.history)(since, **filters)
+
+    @staticmethod
+    def _delay(failures, threshold, config):
+        if failures < threshold:
+            return 0
+        exponent = min(failures - threshold, 32)
+        return min(config['BASE_DELAY'] * 2 ** exponent, config['MAX_DELAY'])
+
+    def register_failure(self, email, ip_address):
+        """
+        Count a failed login; returns the resulting lockout in seconds, if any.
+
+        Call before persisting the failure to `history`, which must only
+        hold earlier failures.
+        """
+        config = self.config
+        now = time.time()
+        retry_after = 0
+        for scope, threshold in self.scopes(email, ip_address, config):
+            counter_key = f'lockout:count:{scope}'
+            seed = self._seed(counter_key, scope, email, ip_address, config)
+            self.cache.add(counter_key, seed, timeout=config['WINDOW'])
+            try:
+                failures = self.cache.incr(counter_key)
+            except ValueError:
+                # Counter expired between add() and incr()
+                self.cache.set(counter_key, 1, timeout=config['WINDOW'])
+                failures = 1
+
+            delay = self._delay(failures, threshold, config)
+            if delay:
+                self.cache.set(f'lockout:lock:{scope}', now + delay, timeout=delay)
+                self._remember({f'lockout:lock:{scope}': now + delay})
+                retry_after = max(retry_after, delay)
+        return retry_after
+
+    async def aregister_failure(self, email, ip_address):
+        config = self.config
+        now = time.time()
+        retry_after = 0
+        for scope, threshold in self.scopes(email, ip_address, config):
+            counter_key = f'lockout:count:{scope}'
+            seed = await self._aseed(counter_key, scope, email, ip_address, config)
+            await self.cache.aadd(counter_key, seed, timeout=config['WINDOW'])
+            try:
+                failures = await self.cache.aincr(counter_key)
+            except ValueError:
+                await self.cache.aset(counter_key, 1, timeout=config['WINDOW'])
+                failures = 1
+
+            delay = self._delay(failures, threshold, config)
+            if delay:
+                await self.cache.aset(f'lockout:lock:{scope}', now + delay, timeout=delay)
+                self._remember({f'lockout:lock:{scope}': now + delay})
+                retry_after = max(retry_after, delay)
+        return retry_after
+
+    def reset(self, email):
+        """Forget an account's failures after a successful login"""
+        scope, _ = self.scopes(email, None, self.config)[0]
+        self.cache.delete_many([f'lockout:count:{scope}', f'lockout:lock:{scope}'])
+        if self.local is not None:
+            self.local.delete(f'lockout:lock:{scope}')
+
+    async def areset(self, email):
+        scope, _ = self.scopes(email, None, self.config)[0]
+        await self.cache.adelete_many([f'lockout:count:{scope}', f'lockout:lock:{scope}'])
+        if self.local is not None:
+            self.local.delete(f'lockout:lock:{scope}')
+
+
+def _failed_login_history(since, email=None, ip_address=None):
+    from .failed_logins import failures_since
+
+    return failures_since(since, email=email, ip_address=ip_address)
+
+
+lockout = LockoutEngine(
+    history=_failed_login_history,
+    local=LocalCache(maxsize=10000, name='lockout-locks'),
+)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.benchmarks import BENCHMARKS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Run accounts benchmarks; fixtures are rolled back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all)')
+        parser.add_argument('--iterations', type=int, default=1000)
+        parser.add_argument('--list', action='store_true', help='List available benchmarks')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, func in sorted(BENCHMARKS.items()):
+                self.stdout.write(f'{name:<24} {(func.__doc__ or "").strip()}')
+            return
+
+        names = options['names'] or sorted(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmark(s): {", ".join(sorted(unknown))}')
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            try:
+                with transaction.atomic():
+                    for row in BENCHMARKS[name](options['iterations']):
+                        queries = '-' if row['queries'] is None else row['queries']
+                        self.stdout.write(
+                            f"  {row['label']:<44} {row['iterations']:>8} iters "
+                            f"{row['seconds']:>9.4f}s {row['ops_per_sec']:>12.1f} ops/s "
+                            f"{queries:>6} queries {row.get('note', '')}".rstrip()
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
@@ -0,0 +1,94 @@
+import dataclasses
+import multiprocessing
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+
+from accounts import synthetic
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Insert realistic synthetic users, registration/device info, tokens and failed-login counters. '
+        'Output depends only on the seed, sizes and --end, not on --workers.'
+    )
+
+    def add_arguments(self, parser):
+        defaults = synthetic.Options()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--failed-logins', type=int, default=defaults.failed_logins,
+                            help='Failed login events, aggregated into 5-minute counters')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Processes inserting chunks in parallel')
+        parser.add_argument('--chunk-size', type=int, default=defaults.chunk_size,
+                            help='Rows generated and inserted per transaction')
+        parser.add_argument('--days', type=int, default=defaults.days, help='Period the data is spread over')
+        parser.add_argument('--end', type=datetime.fromisoformat,
+                            help='End of the period, ISO format (default: today at midnight UTC)')
+        parser.add_argument('--verified-rate', type=float, default=defaults.verified_rate)
+        parser.add_argument('--attack-share', type=float, default=defaults.attack_share,
+                            help='Share of failed logins that come from credential stuffing/brute force bursts')
+        parser.add_argument('--legacy-attempts', action='store_true',
+                            help='Also write one FailedLoginAttempt row per event')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+        end = options['end']
+        if end is not None and end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+
+        first_user_id = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        settings = synthetic.Options(
+            users=options['users'],
+            failed_logins=options['failed_logins'],
+            chunk_size=options['chunk_size'],
+            seed=options['seed'],
+            days=options['days'],
+            verified_rate=options['verified_rate'],
+            attack_share=options['attack_share'],
+            legacy_attempts=options['legacy_attempts'],
+            first_user_id=first_user_id,
+        )
+        if end is not None:
+            settings = dataclasses.replace(settings, end=end)
+
+        tasks = list(synthetic.tasks(settings))
+        self.stdout.write(
+            f'Generating {settings.users} users (ids from {first_user_id}) and {settings.failed_logins} '
+            f'failed logins in {len(tasks)} chunk(s) on {options["workers"]} worker(s)'
+        )
+
+        started = time.perf_counter()
+        totals = {}
+        if options['workers'] == 1:
+            results = map(synthetic.run_chunk, tasks)
+            self.report(results, totals, len(tasks), started)
+        else:
+            # Children must not inherit this process's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['workers'], initializer=connections.close_all) as pool:
+                # Users go first so counters for existing accounts follow them
+                self.report(pool.imap(synthetic.run_chunk, tasks), totals, len(tasks), started)
+        synthetic.reset_sequences()
+
+        elapsed = time.perf_counter() - started
+        rows = sum(totals.values())
+        summary = ', '.join(f'{kind}: {count}' for kind, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s); {summary}'
+        ))
+
+    def report(self, results, totals, chunks, started):
+        for done, (kind, rows) in enumerate(results, 1):
+            totals[kind] = totals.get(kind, 0) + rows
+            if done % 10 == 0 or done == chunks:
+                elapsed = time.perf_counter() - started
+                written = sum(totals.values())
+                self.stdout.write(f'  {done}/{chunks} chunks, {written} rows, {written / elapsed:,.0f} rows/s')
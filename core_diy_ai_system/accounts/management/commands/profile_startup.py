@@ -0,0 +1,72 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, os, sys, time
+os.environ['DJANGO_SETTINGS_MODULE'] = {settings_module!r}
+started = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+settings_loaded = time.perf_counter()
+django.setup()
+apps_ready = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_loaded = time.perf_counter()
+from accounts.warmup import warm
+timings = warm()
+print(json.dumps({{
+    'settings': settings_loaded - started,
+    'app_ready': apps_ready - settings_loaded,
+    'urlconf': urls_loaded - apps_ready,
+    'warmup': timings,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Report import time per module and time to app-ready for a cold process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Number of modules to list')
+        parser.add_argument(
+            '--prefix',
+            default='',
+            help='Only list modules whose name starts with this prefix (e.g. accounts)',
+        )
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE.format(settings_module=settings.SETTINGS_MODULE)],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            self.stderr.write(result.stderr)
+            return
+
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((int(cumulative_us), int(self_us), name.strip()))
+
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        self.stdout.write(self.style.MIGRATE_HEADING('Startup phases'))
+        for phase in ('settings', 'app_ready', 'urlconf'):
+            self.stdout.write(f'  {phase:<24} {phases[phase] * 1000:>10.1f} ms')
+        for step, seconds in phases['warmup'].items():
+            self.stdout.write(f'  warmup.{step:<17} {seconds * 1000:>10.1f} ms')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest imports (cumulative)'))
+        modules = [m for m in modules if m[2].startswith(options['prefix'])]
+        for cumulative_us, self_us, name in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {name:<48} {cumulative_us / 1000:>10.1f} ms  (self {self_us / 1000:.1f} ms)')
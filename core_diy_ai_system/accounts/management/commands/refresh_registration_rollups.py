@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts.rollups import refresh_registration_rollups
+
+
+class Command(BaseCommand):
+    help = 'Incrementally refresh the daily registration funnel rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every day instead of only the days changed since the last run',
+        )
+
+    def handle(self, *args, **options):
+        days = refresh_registration_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {days} day(s) of registration rollups'))
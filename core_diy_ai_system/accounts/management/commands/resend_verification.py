@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.resend import RESEND_COOLDOWN, pending_batches, resend_verification
+
+
+class Command(BaseCommand):
+    help = 'Re-send verification emails to every user whose registration is still pending'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users selected and mailed per batch')
+        parser.add_argument('--min-age', type=int, default=60,
+                            help='Skip registrations younger than this many minutes (default: 60)')
+        parser.add_argument('--cooldown', type=int, default=RESEND_COOLDOWN,
+                            help='Seconds before the same user can be mailed again')
+        parser.add_argument('--limit', type=int, help='Stop after mailing this many users')
+        parser.add_argument('--dry-run', action='store_true', help='Count pending users without mailing them')
+
+    def handle(self, *args, **options):
+        registered_before = timezone.now() - timedelta(minutes=options['min_age'])
+        limit = options['limit']
+        dry_run = options['dry_run']
+        selected = sent = failed = 0
+        started = time.perf_counter()
+
+        for number, users in enumerate(pending_batches(options['batch_size'], registered_before), 1):
+            if limit is not None:
+                # A dry run mails nobody, so it stops after `limit` selected users
+                users = users[:limit - (selected if dry_run else sent)]
+            selected += len(users)
+            if not dry_run:
+                try:
+                    batch_sent = len(resend_verification(users, cooldown=options['cooldown']))
+                except Exception as e:
+                    # The batch's cooldowns were released, so a later run retries it
+                    failed += len(users)
+                    self.stderr.write(f'  batch {number}: mailing {len(users)} user(s) failed: {e}')
+                    continue
+                sent += batch_sent
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'  batch {number}: {batch_sent}/{len(users)} mailed '
+                    f'({len(users) - batch_sent} in cooldown), {sent / elapsed:,.1f} emails/s'
+                )
+            if limit is not None and (selected if dry_run else sent) >= limit:
+                break
+
+        elapsed = time.perf_counter() - started
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'{selected} pending user(s) would be considered'))
+            return
+        skipped = selected - sent - failed
+        summary = (
+            f'Mailed {sent} of {selected} pending user(s) in {elapsed:.1f}s '
+            f'({sent / elapsed if elapsed else 0:,.1f} emails/s); {skipped} skipped by cooldown'
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary}; {failed} failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,106 @@
+import json
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.jobs import close_connections, ensure_periodic_jobs, queue_stats, requeue_stale, work
+
+# How often the supervisor restarts dead workers and requeues stale jobs
+SUPERVISE_INTERVAL = 30
+
+
+def worker_loop(queues, batch_size, poll_interval, stop):
+    # Shutdown is coordinated by the supervisor through `stop`, so the
+    # current job always runs to completion. As in the supervisor, SIGTERM
+    # only flips a flag: setting the Event from the handler can deadlock if
+    # the signal arrives while this process holds the Event's lock.
+    stopping = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+    def should_stop():
+        return bool(stopping) or stop.is_set()
+
+    try:
+        while not should_stop():
+            if work(queues, batch_size, stop=should_stop):
+                continue
+            idle_until = time.monotonic() + poll_interval
+            while not should_stop() and time.monotonic() < idle_until:
+                time.sleep(min(0.5, poll_interval))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the background_job table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Worker processes (default: 2)')
+        parser.add_argument('--queues', default='default,mail', help='Comma-separated queues to work on')
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed per query')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument('--burst', action='store_true', help='Run ready jobs in this process, then exit')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and latency, then exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_stats(), indent=2))
+            return
+
+        queues = [queue.strip() for queue in options['queues'].split(',') if queue.strip()]
+        ensure_periodic_jobs()
+        requeue_stale()
+
+        if options['burst']:
+            ran = work(queues, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {ran} job(s)'))
+            return
+
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        # Setting the Event from a signal handler can deadlock on its lock,
+        # so the handler only flips a flag the supervisor loop polls
+        stopping = []
+        signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+        def spawn():
+            process = context.Process(
+                target=worker_loop,
+                args=(queues, options['batch_size'], options['poll_interval'], stop),
+                daemon=True,
+            )
+            process.start()
+            return process
+
+        close_connections()
+        workers = [spawn() for _ in range(options['concurrency'])]
+        self.stdout.write(
+            f'Started {len(workers)} worker(s) on queue(s) {", ".join(queues)}'
+        )
+
+        next_check = time.monotonic() + SUPERVISE_INTERVAL
+        while not stopping:
+            time.sleep(0.5)
+            if time.monotonic() < next_check:
+                continue
+            next_check = time.monotonic() + SUPERVISE_INTERVAL
+            for index, process in enumerate(workers):
+                if not process.is_alive():
+                    self.stderr.write(f'Worker {process.pid} exited with {process.exitcode}; restarting')
+                    workers[index] = spawn()
+            requeue_stale()
+            ensure_periodic_jobs()
+            close_connections()
+
+        self.stdout.write('Stopping; waiting for running jobs to finish')
+        stop.set()
+        deadline = time.monotonic() + SUPERVISE_INTERVAL
+        for process in workers:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.functional import cached_property
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Path prefixes per priority class; anything unmatched is NORMAL
+    'CRITICAL_PATHS': ('/api/token/refresh/', '/api/profile/', '/api/login/'),
+    'LOW_PATHS': ('/api/register/', '/api/forgot-password/', '/api/resend-verification/'),
+    # Requests in flight per worker before NORMAL and LOW traffic is refused
+    'MAX_IN_FLIGHT': 16,
+    # Share of MAX_IN_FLIGHT that LOW requests may occupy
+    'LOW_SHARE': 0.5,
+    # LOW traffic is refused while the smoothed latency of the other
+    # classes is above this many seconds
+    'LATENCY_TARGET': 0.5,
+    # Seconds for the smoothed latency to halve when no request finishes,
+    # so shedding stops once the worker has been quiet for a while
+    'LATENCY_HALF_LIFE': 5,
+    # Slow by design (password hashing) or rare; not a sign of overload
+    'LATENCY_EXCLUDED_PATHS': ('/api/login/', '/admin/'),
+    # How long a request waits for a slot before it is shed
+    'QUEUE_TIMEOUT': 0.1,
+    'RETRY_AFTER': 1,
+}
+
+EWMA_WEIGHT = 0.2
+
+
+class AdmissionController:
+    """
+    Per-worker, priority-aware admission control.
+
+    CRITICAL requests are always admitted. NORMAL requests are admitted
+    while fewer than MAX_IN_FLIGHT requests are running. LOW requests
+    additionally have to fit within LOW_SHARE of the slots and are refused
+    while the other classes are slower than LATENCY_TARGET, so a flood of
+    signups cannot starve token refreshes. The latency decays with idle
+    time, so one slow burst does not keep LOW traffic out indefinitely.
+    """
+
+    def __init__(self, config=None, clock=time.monotonic):
+        self._config = config
+        self.clock = clock
+        self._condition = threading.Condition()
+        self.in_flight = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+        self.admitted = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+        self.shed = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+        self.latency = 0.0
+        self.latency_at = clock()
+
+    @cached_property
+    def config(self):
+        return {**DEFAULTS, **(self._config or getattr(settings, 'ACCOUNT_ADMISSION_CONTROL', {}))}
+
+    @cached_property
+    def routes(self):
+        routes = [(prefix, CRITICAL) for prefix in self.config['CRITICAL_PATHS']]
+        routes += [(prefix, LOW) for prefix in self.config['LOW_PATHS']]
+        # Longest prefix first so more specific paths win
+        return sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+    def classify(self, path):
+        for prefix, priority in self.routes:
+            if path.startswith(prefix):
+                return priority
+        return NORMAL
+
+    def measures_latency(self, path):
+        return not path.startswith(tuple(self.config['LATENCY_EXCLUDED_PATHS']))
+
+    def _current_latency(self):
+        """The smoothed latency, decayed for the time since the last sample"""
+        idle = self.clock() - self.latency_at
+        return self.latency * 0.5 ** (idle / self.config['LATENCY_HALF_LIFE'])
+
+    def _has_capacity(self, priority):
+        if priority == CRITICAL:
+            return True
+        config = self.config
+        if sum(self.in_flight.values()) >= config['MAX_IN_FLIGHT']:
+            return False
+        if priority == LOW:
+            if self.in_flight[LOW] >= max(1, int(config['MAX_IN_FLIGHT'] * config['LOW_SHARE'])):
+                return False
+            if self._current_latency() > config['LATENCY_TARGET']:
+                return False
+        return True
+
+    def try_admit(self, priority):
+        with self._condition:
+            if not self._has_capacity(priority):
+                return False
+            self.in_flight[priority] += 1
+            self.admitted[priority] += 1
+            return True
+
+    def record_shed(self, priority):
+        with self._condition:
+            self.shed[priority] += 1
+
+    def admit(self, priority):
+        """Block up to QUEUE_TIMEOUT for a slot; False means shed the request"""
+        deadline = time.monotonic() + self.config['QUEUE_TIMEOUT']
+        with self._condition:
+            while not self._has_capacity(priority):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.shed[priority] += 1
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight[priority] += 1
+            self.admitted[priority] += 1
+            return True
+
+    async def aadmit(self, priority):
+        deadline = time.monotonic() + self.config['QUEUE_TIMEOUT']
+        while not self.try_admit(priority):
+            if time.monotonic() >= deadline:
+                self.record_shed(priority)
+                return False
+            await asyncio.sleep(0.005)
+        return True
+
+    def release(self, priority, elapsed, sample=True):
+        with self._condition:
+            self.in_flight[priority] -= 1
+            if sample and priority != LOW:
+                latency = self._current_latency()
+                self.latency = latency + EWMA_WEIGHT * (elapsed - latency)
+                self.latency_at = self.clock()
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'in_flight': dict(self.in_flight),
+                'admitted': dict(self.admitted),
+                'shed': dict(self.shed),
+                'latency_ewma': round(self._current_latency(), 4),
+            }
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """Shed low-priority requests first when this worker is saturated"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, controller=None):
+        self.get_response = get_response
+        self.controller = controller or admission_controller
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def shed_response(self):
+        response = JsonResponse({'detail': 'Server is busy. Please try again shortly.'}, status=503)
+        response['Retry-After'] = str(self.controller.config['RETRY_AFTER'])
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.controller.config['ENABLED']:
+            return self.get_response(request)
+
+        priority = self.controller.classify(request.path_info)
+        if not self.controller.admit(priority):
+            return self.shed_response()
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            self.controller.release(
+                priority, time.monotonic() - started, self.controller.measures_latency(request.path_info)
+            )
+
+    async def __acall__(self, request):
+        if not self.controller.config['ENABLED']:
+            return await self.get_response(request)
+
+        priority = self.controller.classify(request.path_info)
+        if not await self.controller.aadmit(priority):
+            return self.shed_response()
+        started = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.controller.release(
+                priority, time.monotonic() - started, self.controller.measures_latency(request.path_info)
+            )
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userdeviceinfo_userregistrationinfo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('registration_source', models.CharField(max_length=50)),
+                ('device_type', models.CharField(max_length=50)),
+                ('registrations', models.PositiveIntegerField(default=0)),
+                ('verified', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'registration_daily_rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollup_watermark',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userregistrationinfo',
+            index=models.Index(fields=['verified_at'], name='user_regist_verifie_83dba0_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='registrationdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'registration_source', 'device_type'), name='registration_rollup_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:41
+
+import datetime
+from collections import Counter
+
+from django.db import migrations, models
+
+BUCKET_SECONDS = 5 * 60
+FOLD_CHUNK_SIZE = 10000
+
+
+def fold_failed_login_attempts(apps, schema_editor, chunk_size=FOLD_CHUNK_SIZE):
+    """Carry existing per-attempt rows over into bucket counters"""
+    FailedLoginAttempt = apps.get_model('accounts', 'FailedLoginAttempt')
+    FailedLoginCounter = apps.get_model('accounts', 'FailedLoginCounter')
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+    counters = quote(FailedLoginCounter._meta.db_table)
+
+    if connection.vendor == 'postgresql':
+        # Let the database group the whole table in one pass
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {counters} (email, ip_address, bucket, count) '
+                f'SELECT LEFT(LOWER(BTRIM(email)), 254), ip_address, '
+                f'TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM {quote("timestamp")}) / %s) * %s), COUNT(*) '
+                f'FROM {quote(FailedLoginAttempt._meta.db_table)} GROUP BY 1, 2, 3',
+                [BUCKET_SECONDS, BUCKET_SECONDS],
+            )
+        return
+
+    # Elsewhere, count one chunk at a time and add it onto what earlier
+    # chunks wrote, so memory stays bounded by the chunk size
+    upsert = (
+        f'INSERT INTO {counters} (email, ip_address, bucket, count) VALUES (%s, %s, %s, %s) '
+        f'ON CONFLICT (email, ip_address, bucket) DO UPDATE SET count = {counters}.count + excluded.count'
+    )
+
+    def flush(counts):
+        with connection.cursor() as cursor:
+            cursor.executemany(upsert, [
+                (email, ip_address, connection.ops.adapt_datetimefield_value(bucket), count)
+                for (email, ip_address, bucket), count in counts.items()
+            ])
+        counts.clear()
+
+    counts = Counter()
+    attempts = FailedLoginAttempt.objects.order_by('pk').values_list('email', 'ip_address', 'timestamp')
+    for seen, (email, ip_address, timestamp) in enumerate(attempts.iterator(chunk_size=chunk_size), 1):
+        epoch = int(timestamp.timestamp())
+        bucket = datetime.datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=datetime.timezone.utc)
+        counts[(email.strip().lower()[:254], ip_address, bucket)] += 1
+        if seen % chunk_size == 0:
+            flush(counts)
+    if counts:
+        flush(counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_registration_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedLoginCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'failed_login_counter',
+                'indexes': [models.Index(fields=['ip_address', 'bucket'], name='failed_logi_ip_addr_fcabc1_idx')],
+                'constraints': [models.UniqueConstraint(fields=('email', 'ip_address', 'bucket'), name='failed_login_counter_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(fold_failed_login_attempts, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,85 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
+from .tiered_cache import invalidate_user
+
+class DirtyFieldsMixin:
+    """
+    Track which concrete fields changed since the instance was loaded or
+    last saved, so a bare `save()` on an existing row only writes those
+    columns (plus any `auto_now` fields) and skips the query entirely when
+    nothing changed. `_saved_fields` holds the fields the last save wrote, or
+    None if it wrote the whole row.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot(self, attnames=None):
+        values = getattr(self, '_loaded_values', None)
+        if values is None:
+            values = self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if attnames is not None and field.attname not in attnames:
+                continue
+            if field.attname in self.__dict__:
+                values[field.attname] = self.__dict__[field.attname]
+
+    def get_dirty_fields(self):
+        """Names of concrete fields changed since load, or None if untracked"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (
+                field.attname not in loaded
+                or self.__dict__[field.attname] != loaded[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (
+            update_fields is None
+            and not args
+            and not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('using', self._state.db) == self._state.db
+        ):
+            dirty = self.get_dirty_fields()
+            if dirty is not None and self._meta.pk.name not in dirty:
+                if dirty:
+                    dirty += [
+                        field.name for field in self._meta.concrete_fields
+                        if getattr(field, 'auto_now', False) and field.name not in dirty
+                    ]
+                # An empty update_fields makes save() a no-op
+                kwargs['update_fields'] = dirty
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        self._saved_fields = None if update_fields is None else list(update_fields)
+        if update_fields is None:
+            self._snapshot()
+        else:
+            self._snapshot({self._meta.get_field(name).attname for name in update_fields})
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(set(fields) if fields is not None else None)
+
+
 # Create your models here.
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True)
     is_email_verified = models.BooleanField(default=False)
     phone_number = models.CharField(max_length=15, blank=True)
@@ -13,9 +89,22 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    def save(self, *args, **kwargs):
+        previous_email = getattr(self, '_loaded_values', {}).get('email')
+        super().save(*args, **kwargs)
+        # No-op saves, logins and password changes leave the cached payloads
+        # as they are
+        if self._saved_fields is None or not set(self._saved_fields) <= {'last_login', 'password', 'updated_at'}:
+            invalidate_user(self.pk, self.email, previous_email)
+
     def __str__(self):
         return self.email
 
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk, instance.email)
+
 class EmailVerificationToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=255)
@@ -53,6 +142,26 @@ class FailedLoginAttempt(models.Model):
             models.Index(fields=['email', 'ip_address', 'timestamp'])
         ]
 
+class FailedLoginCounter(models.Model):
+    """Failed logins per email, IP address and 5-minute bucket (accounts.failed_logins)"""
+    email = models.EmailField()
+    ip_address = models.GenericIPAddressField()
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'failed_login_counter'
+        constraints = [
+            # Also serves lookups by email
+            models.UniqueConstraint(
+                fields=['email', 'ip_address', 'bucket'],
+                name='failed_login_counter_bucket_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['ip_address', 'bucket'])
+        ]
+
 class PasswordResetToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=255, unique=True)
@@ -93,6 +202,7 @@ class UserRegistrationInfo(models.Model):
         indexes = [
             models.Index(fields=['registration_status']),
             models.Index(fields=['registered_at']),
+            models.Index(fields=['verified_at']),
         ]
 
     def __str__(self):
@@ -114,4 +224,86 @@ class UserDeviceInfo(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_active']),
             models.Index(fields=['ip_address']),
-        ]
\ No newline at end of file
+        ]
+
+
+class RegistrationDailyRollup(models.Model):
+    """Signup/verification counts per registration day, source and device"""
+    day = models.DateField()
+    registration_source = models.CharField(max_length=50)
+    device_type = models.CharField(max_length=50)
+    registrations = models.PositiveIntegerField(default=0)
+    verified = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'registration_daily_rollup'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'registration_source', 'device_type'],
+                name='registration_rollup_bucket_unique'
+            ),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Point up to which a rollup has consumed its source rows"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'rollup_watermark'
+
+
+class Job(models.Model):
+    """Background job claimed by `manage.py run_jobs` workers (accounts.jobs)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    queue = models.CharField(max_length=50, default='default')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Set for periodic jobs so that only one run is pending at a time
+    unique_key = models.CharField(max_length=100, null=True, blank=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker while the job runs; a stale heartbeat means the
+    # worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'background_job'
+        indexes = [
+            # Claim query: ready jobs of a queue in run_at order
+            models.Index(
+                fields=['queue', 'run_at'],
+                condition=models.Q(status='queued'),
+                name='background_job_ready_idx'
+            ),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='background_job_pending_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,198 @@
+"""
+Query plan checks for the hot account queries.
+
+Each HotQuery runs the real code path once, captures the SQL it sent and
+replays it under `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`. A check fails when
+the plan does not use one of the indexes covering `columns` (looked up by
+column, so renamed indexes still count) or touches more than `max_buffers`
+shared buffers. Plans are only meaningful on PostgreSQL with realistic data;
+seed it with `manage.py generate_synthetic_data` and run the checks through
+`QueryPlanTests` or `manage.py benchmark query_plans`.
+
+`plan_snapshots.json` records the indexes and plan shape each query had when
+last accepted; a plan that switches to other indexes fails the suite, and so
+does a query without a snapshot. Set ACCOUNTS_UPDATE_PLAN_SNAPSHOTS=1 to record
+new queries or rewrite all snapshots after an intentional change, then commit
+the file.
+"""
+import json
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .failed_logins import failures_since
+from .models import EmailVerificationToken, FailedLoginCounter, PasswordResetToken, User, UserRegistrationInfo
+from .resend import pending_batches
+from .rollups import _changed_days
+
+SNAPSHOT_PATH = Path(__file__).with_name('plan_snapshots.json')
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    name: str
+    run: Callable
+    table: str
+    # Any index whose leading columns are one of these tuples is acceptable
+    columns: tuple
+    max_buffers: int
+
+
+HOT_QUERIES = (
+    HotQuery(
+        'lockout_email_window',
+        lambda sample: failures_since(sample['since'], email=sample['attacked_email']),
+        FailedLoginCounter._meta.db_table, (('email',),), 100,
+    ),
+    HotQuery(
+        'lockout_ip_window',
+        lambda sample: failures_since(sample['since'], ip_address=sample['attacked_ip']),
+        FailedLoginCounter._meta.db_table, (('ip_address', 'bucket'),), 100,
+    ),
+    HotQuery(
+        'user_by_email',
+        lambda sample: User.objects.get(email=sample['email']),
+        User._meta.db_table, (('email',),), 10,
+    ),
+    HotQuery(
+        'verification_token_lookup',
+        lambda sample: EmailVerificationToken.objects.filter(token=sample['verification_token']).first(),
+        EmailVerificationToken._meta.db_table, (('token',),), 10,
+    ),
+    HotQuery(
+        'reset_token_lookup',
+        lambda sample: PasswordResetToken.objects.filter(
+            token=sample['reset_token'], expires_at__gt=timezone.now()
+        ).first(),
+        PasswordResetToken._meta.db_table, (('token',),), 10,
+    ),
+    HotQuery(
+        'reset_tokens_for_user',
+        lambda sample: list(PasswordResetToken.objects.filter(user_id=sample['user_id'])),
+        PasswordResetToken._meta.db_table, (('user_id',),), 10,
+    ),
+    HotQuery(
+        'registrations_changed_since',
+        lambda sample: _changed_days(sample['changed_since']),
+        UserRegistrationInfo._meta.db_table, (('registered_at',), ('verified_at',)), 400,
+    ),
+    HotQuery(
+        # One batch of `manage.py resend_verification`, keyset-paged on id
+        'pending_registrations_batch',
+        lambda sample: next(pending_batches(500, after_id=sample['pending_after_id']), None),
+        UserRegistrationInfo._meta.db_table, (('registration_status',), ('id',)), 3000,
+    ),
+)
+
+
+def sample_values():
+    """Arguments for HOT_QUERIES taken from the data in the database"""
+    attacked = FailedLoginCounter.objects.order_by('-count', 'id').values('email', 'ip_address', 'bucket').first()
+    latest = UserRegistrationInfo.objects.order_by('-registered_at').values_list('registered_at', flat=True).first()
+    reset = PasswordResetToken.objects.order_by('id').values('token', 'user_id').first()
+    pending = UserRegistrationInfo.objects.filter(registration_status='pending').order_by('id')
+    return {
+        'attacked_email': attacked['email'],
+        'attacked_ip': attacked['ip_address'],
+        'since': attacked['bucket'] - timedelta(hours=12),
+        'email': User.objects.order_by('id').values_list('email', flat=True)[User.objects.count() // 2],
+        'verification_token': EmailVerificationToken.objects.order_by('id').values_list('token', flat=True).first(),
+        'reset_token': reset['token'],
+        'user_id': reset['user_id'],
+        'changed_since': latest - timedelta(days=1),
+        # Halfway through the pending registrations, as in a long bulk resend
+        'pending_after_id': pending.values_list('id', flat=True)[pending.count() // 2],
+    }
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+        result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk(child)
+
+
+def plan_shape(node, depth=0):
+    """Node types, relations and indexes of a plan without its estimates"""
+    line = '  ' * depth + node['Node Type']
+    if 'Index Name' in node:
+        line += f' using {node["Index Name"]}'
+    if 'Relation Name' in node:
+        line += f' on {node["Relation Name"]}'
+    return [line] + [line for child in node.get('Plans', ()) for line in plan_shape(child, depth + 1)]
+
+
+def covering_indexes(table, columns):
+    """Names of indexes on `table` that start with any of the `columns` tuples"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {
+        name for name, info in constraints.items()
+        if (info['index'] or info['unique'] or info['primary_key'])
+        and any(tuple(info['columns'][:len(wanted)]) == wanted for wanted in columns)
+    }
+
+
+def check(query, sample):
+    """Run `query` and return its plan, buffer count and any problems"""
+    with CaptureQueriesContext(connection) as captured:
+        query.run(sample)
+    if len(captured.captured_queries) != 1:
+        raise AssertionError(f'{query.name} ran {len(captured.captured_queries)} queries, expected 1')
+
+    explained = explain(captured.captured_queries[0]['sql'])
+    plan = explained['Plan']
+    used = sorted({node['Index Name'] for node in walk(plan) if 'Index Name' in node})
+    buffers = plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+
+    problems = []
+    expected = covering_indexes(query.table, query.columns)
+    if not expected:
+        problems.append(f'no index on {query.table} covers {query.columns}')
+    elif not expected & set(used):
+        problems.append(f'expected one of {sorted(expected)}, plan uses {used or "no index"}')
+    if buffers > query.max_buffers:
+        problems.append(f'{buffers} shared buffers, limit {query.max_buffers}')
+    seq_scans = [node['Relation Name'] for node in walk(plan) if node['Node Type'] == 'Seq Scan']
+    if query.table in seq_scans:
+        problems.append(f'sequential scan on {query.table}')
+
+    return {
+        'name': query.name,
+        'indexes': used,
+        'shape': plan_shape(plan),
+        'buffers': buffers,
+        'execution_ms': explained.get('Execution Time'),
+        'problems': problems,
+    }
+
+
+def load_snapshots():
+    if not SNAPSHOT_PATH.exists():
+        return {}
+    return json.loads(SNAPSHOT_PATH.read_text())
+
+
+def save_snapshots(results):
+    snapshots = load_snapshots()
+    for result in results:
+        snapshots[result['name']] = {'indexes': result['indexes'], 'shape': result['shape']}
+    SNAPSHOT_PATH.write_text(json.dumps(snapshots, indent=2, sort_keys=True) + '\n')
+
+
+def update_snapshots_requested():
+    return os.getenv('ACCOUNTS_UPDATE_PLAN_SNAPSHOTS') == '1'
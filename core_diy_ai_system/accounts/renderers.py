@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, falling back to the stdlib encoder when
+    orjson is not installed or indented, spaced or ASCII-only output was
+    requested.
+
+    Datetimes and any type orjson does not know natively go through DRF's
+    JSONEncoder, and U+2028/U+2029 are escaped as JSONRenderer does, so the
+    output is byte-for-byte JSONRenderer's. The exception is non-finite
+    floats: orjson renders NaN and Infinity as null, where JSONRenderer
+    raises under STRICT_JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Valid JSON, but not valid inside a <script> tag
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,92 @@
+"""
+Verification email resends.
+
+A user gets at most one resend per cooldown, whether it was asked for through
+`POST /api/resend-verification/` or sent by `manage.py resend_verification`.
+The cooldown is a cache key claimed with `add()`, so concurrent requests and a
+running bulk resend cannot both mail the same user. Messages are rendered from
+the shared compiled templates and handed to the mailer a batch at a time over
+one connection (or as one job per message with ACCOUNTS_MAIL_VIA_JOBS).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UserRegistrationInfo
+from .utils import build_verification_email, deliver_mail_batch
+
+RESEND_COOLDOWN = 15 * 60
+
+
+def _cooldown_key(user_id):
+    return f'accounts:verification-resend:{user_id}'
+
+
+def claim_cooldowns(user_ids, timeout=RESEND_COOLDOWN):
+    """Put `user_ids` in cooldown; returns those that were not in it already"""
+    keys = {_cooldown_key(user_id): user_id for user_id in user_ids}
+    cooling = cache.get_many(keys)
+    return [
+        user_id for key, user_id in keys.items()
+        if key not in cooling and cache.add(key, 1, timeout=timeout)
+    ]
+
+
+def resend_verification(users, cooldown=RESEND_COOLDOWN):
+    """
+    Mail a fresh verification link to each unverified user in `users` that is
+    not in cooldown; returns the ids of the users mailed.
+    """
+    users = [user for user in users if not user.is_email_verified]
+    allowed = set(claim_cooldowns([user.pk for user in users], cooldown))
+    recipients = [user for user in users if user.pk in allowed]
+    if not recipients:
+        return []
+
+    messages = []
+    for user in recipients:
+        _, plain_message, html_message = build_verification_email(user)
+        messages.append({
+            'subject': 'Verify Your Email Address',
+            'message': plain_message,
+            'from_email': settings.DEFAULT_FROM_EMAIL,
+            'recipient_list': [user.email],
+            'html_message': html_message,
+        })
+    try:
+        deliver_mail_batch(messages)
+    except Exception:
+        # Nothing was sent, so let the users ask again straight away
+        cache.delete_many([_cooldown_key(user.pk) for user in recipients])
+        raise
+
+    sent = [user.pk for user in recipients]
+    UserRegistrationInfo.objects.filter(user_id__in=sent).update(
+        verification_attempts=F('verification_attempts') + 1,
+        last_verification_attempt=timezone.now(),
+    )
+    return sent
+
+
+def pending_batches(batch_size=500, registered_before=None, after_id=0):
+    """
+    Users whose registration is still pending, in batches keyset-paged on the
+    registration id so each batch is one index range scan however deep the
+    run gets.
+    """
+    pending = (
+        UserRegistrationInfo.objects
+        .filter(registration_status='pending', user__is_email_verified=False, user__is_active=True)
+        .select_related('user')
+        .only('id', 'user__id', 'user__email', 'user__username', 'user__is_email_verified')
+        .order_by('id')
+    )
+    if registered_before is not None:
+        pending = pending.filter(registered_at__lt=registered_before)
+    while True:
+        batch = list(pending.filter(id__gt=after_id)[:batch_size])
+        if not batch:
+            return
+        after_id = batch[-1].id
+        yield [registration.user for registration in batch]
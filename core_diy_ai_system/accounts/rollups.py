@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import RegistrationDailyRollup, RollupWatermark, UserDeviceInfo, UserRegistrationInfo
+
+REGISTRATION_FUNNEL = 'registration_funnel'
+
+# Rows are re-scanned this far behind the watermark so that registrations
+# committed by transactions still in flight during the last run are not lost.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def _day_range(day):
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    return start, start + timedelta(days=1)
+
+
+def _changed_days(since):
+    """Registration days touched by signups or verifications after `since`"""
+    changed = UserRegistrationInfo.objects.filter(
+        Q(registered_at__gte=since) | Q(verified_at__gte=since)
+    )
+    return set(
+        changed.annotate(day=TruncDate('registered_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+
+def _aggregate(queryset):
+    first_device = (
+        UserDeviceInfo.objects
+        .filter(user=OuterRef('user_id'))
+        .order_by('first_used', 'id')
+        .values('device_type')[:1]
+    )
+    return (
+        queryset
+        .annotate(
+            day=TruncDate('registered_at'),
+            device=Coalesce(Subquery(first_device), Value('unknown')),
+        )
+        .values('day', 'registration_source', 'device')
+        .annotate(
+            registrations=Count('id'),
+            verified=Count('id', filter=Q(verified_at__isnull=False)),
+        )
+        .order_by()
+    )
+
+
+def refresh_registration_rollups(full=False, wait=True):
+    """
+    Bring `RegistrationDailyRollup` up to date.
+
+    Only the registration days that saw a signup or a verification since the
+    last run are recomputed; `full=True` rebuilds every day. Returns the number
+    of days recomputed, or None if another refresh holds the watermark and
+    `wait` is False.
+    """
+    started_at = timezone.now()
+    with transaction.atomic():
+        RollupWatermark.objects.get_or_create(
+            name=REGISTRATION_FUNNEL,
+            defaults={'value': started_at - timedelta(days=365 * 100)}
+        )
+        watermarks = RollupWatermark.objects.select_for_update(skip_locked=not wait)
+        watermark = watermarks.filter(name=REGISTRATION_FUNNEL).first()
+        if watermark is None:
+            return None
+
+        if full:
+            RegistrationDailyRollup.objects.all().delete()
+            days = None
+            source = UserRegistrationInfo.objects.all()
+        else:
+            days = _changed_days(watermark.value - WATERMARK_OVERLAP)
+            if not days:
+                source = None
+            else:
+                ranges = Q()
+                for day in days:
+                    start, end = _day_range(day)
+                    ranges |= Q(registered_at__gte=start, registered_at__lt=end)
+                source = UserRegistrationInfo.objects.filter(ranges)
+                RegistrationDailyRollup.objects.filter(day__in=days).delete()
+
+        rows = []
+        if source is not None:
+            rows = [
+                RegistrationDailyRollup(
+                    day=row['day'],
+                    registration_source=row['registration_source'],
+                    device_type=row['device'],
+                    registrations=row['registrations'],
+                    verified=row['verified'],
+                )
+                for row in _aggregate(source)
+            ]
+            RegistrationDailyRollup.objects.bulk_create(rows, batch_size=1000)
+
+        watermark.value = started_at
+        watermark.save(update_fields=['value', 'updated_at'])
+
+    if days is None:
+        return len({row.day for row in rows})
+    return len(days)
+
+
+def schedule_registration_rollup_refresh():
+    """
+    Refresh the rollups once the current transaction commits, if
+    ACCOUNTS_ROLLUP_ON_COMMIT is set.
+
+    The refresh runs synchronously in the thread that committed, i.e. inside
+    the signup or verification request, and adds its aggregation time to that
+    response. It never waits for a refresh already running elsewhere. With
+    `manage.py run_jobs` workers leave the setting off: the periodic
+    `accounts.refresh_registration_rollups` job keeps the rollups current
+    off the request path.
+    """
+    if getattr(settings, 'ACCOUNTS_ROLLUP_ON_COMMIT', False):
+        transaction.on_commit(
+            lambda: refresh_registration_rollups(wait=False)
+        )
@@ -1,10 +1,14 @@
 # accounts/serializers.py
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import PasswordResetToken 
+from .last_login import last_login_buffer
+from .tiered_cache import user_id_by_email
 
 
 # Accessing Accounts/Models.py
@@ -34,21 +38,46 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'username', 'is_email_verified', 'created_at']
         read_only_fields = ['is_email_verified']
 
+class UserReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only equivalent of UserSerializer for hot response paths. Builds the
+    payload directly instead of constructing ModelSerializer fields per call.
+    """
+    created_at_field = serializers.DateTimeField()
+
+    def to_representation(self, user):
+        return {
+            'id': user.id,
+            'email': user.email,
+            'username': user.username,
+            'is_email_verified': user.is_email_verified,
+            'created_at': self.created_at_field.to_representation(user.created_at),
+        }
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
-        data['user'] = UserSerializer(self.user).data
+        data['user'] = UserReadSerializer(self.user).data
+        if getattr(settings, 'ACCOUNTS_BATCH_LAST_LOGIN', False):
+            last_login_buffer.record(self.user.pk, timezone.now())
         return data
     
 class ForgotPasswordSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
-    def validate_email(self, value):
-        try:
-            User.objects.get(email=value)
-            return value
-        except User.DoesNotExist:
-            raise serializers.ValidationError("No user found with this email address.")
+    def validate(self, data):
+        # The view gets the cached id, so a known address costs one primary
+        # key lookup and an unknown one no query at all
+        email = data['email']
+        data['user_id'] = user_id_by_email.get_or_load(
+            email, lambda: User.objects.filter(email=email).values_list('id', flat=True).first()
+        )
+        if data['user_id'] is None:
+            raise serializers.ValidationError({'email': ["No user found with this email address."]})
+        return data
+
+class ResendVerificationSerializer(serializers.Serializer):
+    email = serializers.EmailField()
 
 class ResetPasswordSerializer(serializers.Serializer):
     token = serializers.CharField()
@@ -76,4 +105,49 @@ class ResetPasswordSerializer(serializers.Serializer):
         user.save()
         # Delete the used token
         PasswordResetToken.objects.filter(user=user).delete()
-        return user
\ No newline at end of file
+        return user
+
+# Input-only serializers for accounts.async_views. They run no database
+# validators, so they are safe to call from the event loop; the async views
+# do the lookups themselves with the async ORM.
+
+class AsyncRegistrationSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=254)
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    password = serializers.CharField(write_only=True, min_length=8)
+    password_confirm = serializers.CharField(write_only=True)
+
+    def validate(self, data):
+        if data['password'] != data['password_confirm']:
+            raise serializers.ValidationError("Passwords don't match")
+        return data
+
+
+class AsyncForgotPasswordSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+
+
+class AsyncResetPasswordSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    new_password = serializers.CharField(min_length=8, write_only=True)
+    confirm_password = serializers.CharField(write_only=True)
+
+    def validate(self, data):
+        if data['new_password'] != data['confirm_password']:
+            raise serializers.ValidationError("Passwords don't match")
+        return data
+
+
+class RegistrationFunnelQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    source = serializers.CharField(required=False, max_length=50)
+    device_type = serializers.CharField(required=False, max_length=50)
+
+    def validate(self, data):
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timezone.timedelta(days=30)
+        if start > end:
+            raise serializers.ValidationError("start must be on or before end")
+        data['start'], data['end'] = start, end
+        return data
@@ -0,0 +1,200 @@
+"""
+Static files served by the application process.
+
+`collectstatic` writes content-hashed copies of every asset plus a manifest
+(ManifestStaticFilesStorage) and, next to each compressible hashed file,
+precompressed `.gz` and, when the `brotli` package is installed, `.br`
+variants. StaticFilesMiddleware then serves STATIC_ROOT straight from the
+app: hashed files are cached for a year as immutable, the best precompressed
+variant is picked from Accept-Encoding, and responses are FileResponses, which
+gunicorn hands to `sendfile()` through `wsgi.file_wrapper`. This is meant for
+single-container deployments with no CDN or web server in front.
+"""
+import gzip
+import mimetypes
+import os
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ico', '.ttf', '.otf', '.eot',
+}
+# Smaller files, or variants that save less than this, are not worth a variant
+MIN_COMPRESS_SIZE = 256
+MIN_COMPRESS_RATIO = 0.95
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names can change content on the next deploy
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+
+# (Accept-Encoding token, Content-Encoding, file suffix), in preference order
+ENCODINGS = (('br', 'br', '.br'), ('gzip', 'gzip', '.gz'))
+
+
+def compress_file(path):
+    """Write .gz/.br variants of `path` where they pay off; returns their paths"""
+    path = Path(path)
+    if path.suffix.lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    data = path.read_bytes()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    # mtime=0 keeps the .gz output identical across collectstatic runs
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compress in compressors:
+        compressed = compress(data)
+        if len(compressed) < len(data) * MIN_COMPRESS_RATIO:
+            variant = path.with_name(path.name + suffix)
+            variant.write_bytes(compressed)
+            written.append(variant)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed names plus precompressed variants of the hashed files"""
+    # Until collectstatic has written a manifest, fall back to unhashed names
+    # instead of failing every page that uses {% static %}
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and not isinstance(processed, Exception):
+                compress_file(self.path(hashed_name))
+            yield name, hashed_name, processed
+
+
+def parse_accept_encoding(header):
+    """{coding: q value} of an Accept-Encoding header; q=0 refuses a coding"""
+    accepted = {}
+    for item in header.lower().split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class StaticFile:
+    __slots__ = ('content_type', 'cache_control', 'variants')
+
+    def __init__(self, path, immutable):
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else MUTABLE_CACHE_CONTROL
+        # {content encoding or None: (path, size, etag, last modified)}
+        self.variants = {}
+        for _, encoding, suffix in ((None, None, ''), *ENCODINGS):
+            try:
+                stat = os.stat(path + suffix)
+            except FileNotFoundError:
+                continue
+            etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+            self.variants[encoding] = (path + suffix, stat.st_size, etag, http_date(stat.st_mtime))
+
+    def select(self, accept_encoding):
+        """Our preferred variant among the codings Accept-Encoding allows"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for token, encoding, _ in ENCODINGS:
+            if accepted.get(token, accepted.get('*', 0)) > 0 and encoding in self.variants:
+                return encoding
+        return None
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files under STATIC_URL from STATIC_ROOT.
+
+    The file index is built from a walk of STATIC_ROOT when the handler is
+    loaded (before fork under `gunicorn --preload`), so a request costs a
+    dict lookup and an open(); run `collectstatic` before starting the
+    server. Disabled unless ACCOUNTS_SERVE_STATIC is set, which it is not
+    with DEBUG on so runserver keeps serving the unhashed source files.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ACCOUNTS_SERVE_STATIC', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.files = self.build_index(str(settings.STATIC_ROOT))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def build_index(root):
+        immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        variant_suffixes = tuple(suffix for _, _, suffix in ENCODINGS)
+
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(variant_suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                files[name] = StaticFile(path, name in immutable)
+        return files
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        static_file = self.files.get(request.path_info[len(self.prefix):])
+        if static_file is None:
+            return None
+
+        encoding = static_file.select(request.headers.get('Accept-Encoding', ''))
+        path, size, etag, last_modified = static_file.variants[encoding]
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = str(size)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # FileResponse names the file after the variant on disk
+            response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if len(static_file.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = static_file.cache_control
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.serve(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return await self.get_response(request) if response is None else response
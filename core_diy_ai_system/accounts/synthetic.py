@@ -0,0 +1,366 @@
+"""
+Deterministic synthetic data for capacity and query-plan work.
+
+Rows are produced in fixed-size chunks. Every chunk draws from its own
+`random.Random(f'{seed}:{kind}:{index}')`, so the same seed, sizes and end
+date yield the same rows whatever the number of worker processes. On
+PostgreSQL rows are streamed with `COPY ... FROM STDIN`; other databases get
+a plain `executemany` INSERT.
+
+Users get explicit ids from a contiguous block above the current maximum so
+their registration info, devices and tokens can be written by the same chunk
+without reading anything back.
+"""
+import csv
+import io
+import ipaddress
+import math
+import random
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from .failed_logins import BUCKET_SECONDS
+from .models import (
+    EmailVerificationToken,
+    FailedLoginAttempt,
+    FailedLoginCounter,
+    PasswordResetToken,
+    User,
+    UserDeviceInfo,
+    UserRegistrationInfo,
+)
+from .utils import get_device_info
+
+FIRST_NAMES = (
+    'james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda', 'william', 'elizabeth',
+    'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah', 'priya', 'wei',
+    'mohammed', 'fatima', 'carlos', 'ana', 'yuki', 'olga', 'kwame', 'amara', 'lucas', 'sofia',
+)
+LAST_NAMES = (
+    'smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis', 'rodriguez', 'martinez',
+    'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson', 'thomas', 'taylor', 'moore', 'jackson', 'martin',
+    'lee', 'patel', 'khan', 'nguyen', 'kim', 'chen', 'singh', 'ivanova', 'okafor', 'silva',
+)
+EMAIL_DOMAINS = (
+    ('gmail.com', 50), ('yahoo.com', 12), ('outlook.com', 12), ('hotmail.com', 8), ('icloud.com', 8),
+    ('proton.me', 3), ('example.org', 7),
+)
+
+# Real-world user agents with a skewed share, most popular first
+USER_AGENTS = (
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 38),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.0 Mobile/15E148 Safari/604.1', 22),
+    ('Mozilla/5.0 (Linux; Android 14; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Mobile Safari/537.36', 16),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Safari/605.1.15', 9),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0', 6),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0', 4),
+    ('Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.0 Mobile/15E148 Safari/604.1', 3),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/119.0.0.0 Safari/537.36', 1),
+    ('okhttp/4.12.0', 0.6),
+    ('python-requests/2.31.0', 0.4),
+)
+REGISTRATION_SOURCES = (('web', 60), ('mobile', 30), ('api', 10))
+
+# Residential-looking IPv4 space; attack traffic comes from hosting ranges
+CLIENT_NETWORKS = [ipaddress.ip_network(n) for n in ('73.0.0.0/8', '86.0.0.0/8', '98.0.0.0/8', '112.0.0.0/8')]
+CLIENT_V6_NETWORK = ipaddress.ip_network('2a02:8000::/20')
+ATTACK_NETWORKS = [ipaddress.ip_network(n) for n in ('45.0.0.0/8', '185.0.0.0/8', '193.0.0.0/8')]
+
+
+@dataclass
+class Options:
+    users: int = 100_000
+    failed_logins: int = 1_000_000
+    chunk_size: int = 10_000
+    seed: int = 1
+    days: int = 365
+    end: datetime = field(default_factory=lambda: datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0))
+    verified_rate: float = 0.7
+    reset_token_rate: float = 0.03
+    ipv6_share: float = 0.1
+    # Share of failed logins that belong to attack bursts rather than typos
+    attack_share: float = 0.85
+    # Of the attack bursts, how many are credential stuffing (one address,
+    # many accounts) rather than brute force (one account, many guesses)
+    stuffing_share: float = 0.7
+    legacy_attempts: bool = False
+    first_user_id: int = 1
+
+
+def weighted(choices):
+    values, weights = zip(*choices)
+    cumulative, total = [], 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return values, cumulative
+
+
+def random_ip(rng, networks, ipv6_share=0.0):
+    if ipv6_share and rng.random() < ipv6_share:
+        network = CLIENT_V6_NETWORK
+    else:
+        network = rng.choice(networks)
+    return str(network[rng.randrange(1, network.num_addresses - 1)])
+
+
+class TableWriter:
+    """
+    Buffered rows for one table, flushed with COPY or executemany. With
+    `accumulate` = (key columns, summed columns), rows whose key already
+    exists add their sums onto the existing row instead of failing.
+    """
+
+    def __init__(self, model, columns, accumulate=None):
+        self.table = model._meta.db_table
+        self.columns = columns
+        self.accumulate = accumulate
+        self.rows = []
+
+    def add(self, *row):
+        self.rows.append(row)
+
+    def on_conflict(self):
+        if self.accumulate is None:
+            return ''
+        keys, summed = self.accumulate
+        table = connection.ops.quote_name(self.table)
+        updates = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in summed)
+        return f' ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}'
+
+    def flush(self, cursor):
+        if not self.rows:
+            return 0
+        table, columns = connection.ops.quote_name(self.table), ', '.join(self.columns)
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in self.rows:
+                writer.writerow([r'\N' if value is None else value for value in row])
+            buffer.seek(0)
+            # COPY cannot resolve conflicts, so upserts go through a staging table
+            target = table if self.accumulate is None else connection.ops.quote_name(f'{self.table}_staging')
+            if self.accumulate is not None:
+                cursor.execute(f'CREATE TEMPORARY TABLE {target} AS SELECT {columns} FROM {table} WITH NO DATA')
+            cursor.copy_expert(
+                f'COPY {target} ({columns}) '
+                "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+            if self.accumulate is not None:
+                cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {target}{self.on_conflict()}')
+                cursor.execute(f'DROP TABLE {target}')
+        else:
+            placeholders = ', '.join(['%s'] * len(self.columns))
+            adapt = connection.ops.adapt_datetimefield_value
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders}){self.on_conflict()}',
+                [[adapt(value) if isinstance(value, datetime) else value for value in row] for row in self.rows],
+            )
+        written, self.rows = len(self.rows), []
+        return written
+
+
+def chunk_rng(options, kind, index):
+    return random.Random(f'{options.seed}:{kind}:{index}')
+
+
+def identity(options, user_id):
+    """(first name, last name, email) of a user, derived from its id alone"""
+    rng = chunk_rng(options, 'identity', user_id)
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    domains, cumulative = weighted(EMAIL_DOMAINS)
+    domain = rng.choices(domains, cum_weights=cumulative)[0]
+    return first_name, last_name, f'{first_name}.{last_name}.{user_id}@{domain}'
+
+
+def generate_users(options, index, password_hash):
+    """Users of chunk `index` with registration info, devices and tokens"""
+    rng = chunk_rng(options, 'users', index)
+    agents, agent_weights = weighted(USER_AGENTS)
+    sources, source_weights = weighted(REGISTRATION_SOURCES)
+
+    users = TableWriter(User, [
+        'id', 'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name', 'is_staff',
+        'is_active', 'date_joined', 'email', 'is_email_verified', 'phone_number', 'created_at', 'updated_at',
+    ])
+    registrations = TableWriter(UserRegistrationInfo, [
+        'user_id', 'ip_address', 'user_agent', 'registration_source', 'registration_status',
+        'verification_attempts', 'last_verification_attempt', 'registered_at', 'verified_at',
+    ])
+    devices = TableWriter(UserDeviceInfo, [
+        'user_id', 'device_type', 'os_type', 'browser', 'ip_address', 'last_used', 'first_used', 'is_active',
+    ])
+    verification_tokens = TableWriter(EmailVerificationToken, ['user_id', 'token', 'created_at', 'expires_at'])
+    reset_tokens = TableWriter(PasswordResetToken, ['user_id', 'token', 'created_at', 'expires_at'])
+
+    first = options.first_user_id + index * options.chunk_size
+    last = min(options.first_user_id + options.users, first + options.chunk_size)
+    for user_id in range(first, last):
+        # Signups grow linearly over the period: density 2(1 - x) for x of
+        # the way back from `end`
+        registered_at = options.end - timedelta(days=options.days * (1 - math.sqrt(rng.random())))
+        verified = rng.random() < options.verified_rate
+        verified_at = registered_at + timedelta(minutes=rng.lognormvariate(2.5, 1.5)) if verified else None
+        last_login = (
+            verified_at + timedelta(seconds=rng.random() * (options.end - verified_at).total_seconds())
+            if verified and verified_at < options.end else None
+        )
+        user_agent = rng.choices(agents, cum_weights=agent_weights)[0]
+        ip_address = random_ip(rng, CLIENT_NETWORKS, options.ipv6_share)
+        first_name, last_name, email = identity(options, user_id)
+
+        users.add(
+            user_id, password_hash, last_login, False, f'{first_name}{last_name}{user_id}',
+            first_name.title(), last_name.title(), False, True, registered_at, email,
+            verified, '', registered_at, verified_at or registered_at,
+        )
+        registrations.add(
+            user_id, ip_address, user_agent, rng.choices(sources, cum_weights=source_weights)[0],
+            'verified' if verified else 'pending', 1 if verified else rng.choice((0, 0, 1, 2)),
+            verified_at, registered_at, verified_at,
+        )
+
+        device = get_device_info(user_agent)
+        # Most people keep one device; a few collect several
+        for device_index in range(1 + min(int(rng.expovariate(2.0)), 4)):
+            if device_index:
+                device = get_device_info(rng.choices(agents, cum_weights=agent_weights)[0])
+                ip_address = random_ip(rng, CLIENT_NETWORKS, options.ipv6_share)
+            devices.add(
+                user_id, device['device_type'], device['os_type'][:50], device['browser'][:50], ip_address,
+                last_login or registered_at, registered_at, rng.random() < 0.9,
+            )
+
+        if not verified:
+            verification_tokens.add(
+                user_id, str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                registered_at, registered_at + timedelta(hours=24),
+            )
+        if rng.random() < options.reset_token_rate:
+            requested_at = registered_at + (options.end - registered_at) * rng.random()
+            reset_tokens.add(
+                user_id, str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                requested_at, requested_at + timedelta(hours=24),
+            )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        return sum(
+            writer.flush(cursor)
+            for writer in (users, registrations, devices, verification_tokens, reset_tokens)
+        )
+
+
+def _bucket(moment):
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=timezone.utc)
+
+
+def failed_login_events(options, index, chunks):
+    """
+    (email, ip, timestamp) events of failed-login chunk `index`.
+
+    Accounts are partitioned between chunks (user id modulo `chunks`) and
+    attack sources are drawn per chunk, so chunks never produce the same
+    (email, ip, bucket) key and can be written concurrently.
+    """
+    rng = chunk_rng(options, 'failed_logins', index)
+    size = min(options.chunk_size, options.failed_logins - index * options.chunk_size)
+    start = options.end - timedelta(days=options.days)
+    span = (options.end - start).total_seconds()
+
+    def existing_email():
+        if not options.users:
+            return unknown_email()
+        user_id = options.first_user_id + index + chunks * rng.randrange(max(1, options.users // chunks))
+        return identity(options, user_id)[2]
+
+    def unknown_email():
+        return f'{rng.choice(FIRST_NAMES)}{rng.randrange(10 ** 6)}.{index}@{rng.choice(EMAIL_DOMAINS)[0]}'
+
+    produced = 0
+    attack_events = int(size * options.attack_share)
+    while produced < attack_events:
+        burst_start = start + timedelta(seconds=rng.random() * span)
+        network = rng.choice(ATTACK_NETWORKS)
+        # Bursts hit the rate limits in minutes, from a handful of hosts in one /24
+        subnet = int(network.network_address) + (rng.randrange(network.num_addresses) & ~0xff)
+        sources = [str(ipaddress.ip_address(subnet + rng.randrange(1, 255))) for _ in range(rng.randint(1, 8))]
+        length = min(attack_events - produced, int(rng.paretovariate(1.2) * 50))
+        duration = rng.uniform(60, 3600)
+        brute_force = rng.random() >= options.stuffing_share
+        target = existing_email()
+        for _ in range(length):
+            if not brute_force:
+                target = existing_email() if rng.random() < 0.3 else unknown_email()
+            yield target, rng.choice(sources), burst_start + timedelta(seconds=rng.random() * duration)
+        produced += length
+
+    # Legitimate typos: a couple of failures from the user's own address
+    while produced < size:
+        email = existing_email()
+        ip_address = random_ip(rng, CLIENT_NETWORKS, options.ipv6_share)
+        moment = start + timedelta(seconds=rng.random() * span)
+        for _ in range(min(size - produced, rng.choice((1, 1, 1, 2, 3)))):
+            yield email, ip_address, moment + timedelta(seconds=rng.randrange(120))
+            produced += 1
+
+
+def generate_failed_logins(options, index, chunks):
+    counters = Counter()
+    attempts = TableWriter(FailedLoginAttempt, ['email', 'ip_address', 'timestamp'])
+    for email, ip_address, moment in failed_login_events(options, index, chunks):
+        counters[(email.lower(), ip_address, _bucket(moment))] += 1
+        if options.legacy_attempts:
+            attempts.add(email, ip_address, moment)
+
+    # Chunks and re-runs with the same seed can hit the same bucket row
+    writer = TableWriter(
+        FailedLoginCounter, ['email', 'ip_address', 'bucket', 'count'],
+        accumulate=(['email', 'ip_address', 'bucket'], ['count']),
+    )
+    for (email, ip_address, bucket), count in counters.items():
+        writer.add(email, ip_address, bucket, count)
+    with transaction.atomic(), connection.cursor() as cursor:
+        return writer.flush(cursor) + attempts.flush(cursor)
+
+
+def run_chunk(task):
+    kind, options, index, extra = task
+    if kind == 'users':
+        return kind, generate_users(options, index, extra)
+    return kind, generate_failed_logins(options, index, extra)
+
+
+def tasks(options):
+    password_hash = make_password(f'synthetic-{options.seed}')
+    user_chunks = math.ceil(options.users / options.chunk_size)
+    login_chunks = math.ceil(options.failed_logins / options.chunk_size)
+    yield from (('users', options, index, password_hash) for index in range(user_chunks))
+    yield from (('failed_logins', options, index, login_chunks) for index in range(login_chunks))
+
+
+def reset_sequences():
+    """Move the users id sequence past the explicitly inserted ids"""
+    if connection.vendor != 'postgresql':
+        return
+    table = User._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT MAX(id) FROM " +
+            connection.ops.quote_name(table) + '))',
+            [table],
+        )
@@ -0,0 +1,40 @@
+"""Background jobs of the accounts app, run by `manage.py run_jobs`"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from .jobs import job, periodic_job, purge_finished
+from .models import EmailVerificationToken, PasswordResetToken
+from .rollups import refresh_registration_rollups
+
+
+@job('accounts.send_mail', queue='mail', max_attempts=5)
+def send_mail_job(subject, message, recipient_list, html_message=None, from_email=None):
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list=recipient_list,
+        html_message=html_message,
+        fail_silently=False,
+    )
+
+
+@periodic_job('accounts.cleanup_expired_tokens', every=timedelta(hours=1))
+def cleanup_expired_tokens():
+    now = timezone.now()
+    EmailVerificationToken.objects.filter(expires_at__lt=now).delete()
+    PasswordResetToken.objects.filter(expires_at__lt=now).delete()
+
+
+@periodic_job('accounts.refresh_registration_rollups', every=timedelta(minutes=5))
+def refresh_rollups():
+    # Another worker (or the cron command) already refreshing is fine
+    refresh_registration_rollups(wait=False)
+
+
+@periodic_job('jobs.purge_finished', every=timedelta(days=1))
+def purge_finished_jobs():
+    purge_finished()
@@ -1,3 +1,1116 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import re
+import smtplib
+import tempfile
+import time
+import unittest
+import uuid
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core import signing
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import jobs, query_plans
+from .admin import EstimatedCountPaginator, FailedLoginAttemptAdmin
+from .async_views import AsyncForgotPasswordView, AsyncRegisterView, AsyncTokenObtainPairView
+from .client_ip import UNKNOWN_IP, ClientIPResolver
+from .failed_logins import failures_since, record_failed_login
+from .idempotency import IdempotentRequest
+from .jwks import KeyRotatingTokenBackend, get_jwks_document, get_signing_keys
+from .last_login import LastLoginBuffer, last_login_buffer
+from .lockout import LockoutEngine, lockout
+from .middleware import CRITICAL, LOW, AdmissionController, AdmissionControlMiddleware
+from .models import (
+    EmailVerificationToken,
+    FailedLoginAttempt,
+    FailedLoginCounter,
+    Job,
+    RegistrationDailyRollup,
+    RollupWatermark,
+    User,
+    UserRegistrationInfo,
+)
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .resend import pending_batches, resend_verification
+from .rollups import REGISTRATION_FUNNEL, refresh_registration_rollups, schedule_registration_rollup_refresh
+from .serializers import UserReadSerializer, UserSerializer
+from .synthetic import Options, failed_login_events, generate_failed_logins
+from .staticfiles import StaticFilesMiddleware, compress_file
+from .tiered_cache import REGISTRY, LocalCache, TieredCache, profile_cache, user_id_by_email
+from .utils import (
+    _parse_device_info,
+    deliver_mail_batch,
+    get_device_info,
+    send_verification_email,
+    verification_email_templates,
+)
+from .verification_tokens import VERIFICATION_SALT, decode_verification_token, encode_verification_token
+from .views import CustomTokenObtainPairView, ForgotPasswordView, RegisterView
+from .warmup import SAMPLE_USER_AGENTS, warm
+
+
+def updated_columns(sql):
+    """Column names in the SET clause of an UPDATE statement"""
+    set_clause = re.search(r'( SET .*) WHERE', sql, re.S).group(1)
+    return set(re.findall(r'(?: SET |, )"(\w+)" =', set_clause))
+
+
+class DirtyFieldsSaveTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(email='dirty@example.com', username='dirty', password='old-password')
+        self.user = User.objects.get(email='dirty@example.com')
+
+    def assertSingleUpdate(self, queries, columns):
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updated_columns(updates[0]), columns)
+
+    def test_save_writes_only_changed_columns(self):
+        self.user.is_email_verified = True
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertSingleUpdate(ctx.captured_queries, {'is_email_verified', 'updated_at'})
+
+    def test_save_without_changes_skips_query(self):
+        with self.assertNumQueries(0):
+            self.user.save()
+
+    def test_set_password_writes_only_password(self):
+        self.user.set_password('new-password')
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertSingleUpdate(ctx.captured_queries, {'password', 'updated_at'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+
+    def test_fields_are_clean_after_save(self):
+        self.user.phone_number = '555'
+        self.user.save()
+        self.assertEqual(self.user.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            self.user.save()
+
+    def test_explicit_update_fields_keep_other_changes_dirty(self):
+        self.user.phone_number = '555'
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.user.get_dirty_fields(), ['phone_number'])
+
+    def test_refresh_from_db_resets_tracking(self):
+        self.user.phone_number = '555'
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.get_dirty_fields(), [])
+
+    def test_created_instance_is_tracked(self):
+        user = User.objects.create_user(email='new@example.com', username='new', password='password')
+        user.first_name = 'New'
+        with CaptureQueriesContext(connection) as ctx:
+            user.save()
+        self.assertSingleUpdate(ctx.captured_queries, {'first_name', 'updated_at'})
+
+    def test_deferred_field_assignment_is_written(self):
+        user = User.objects.only('id').get(pk=self.user.pk)
+        user.phone_number = '555'
+        with CaptureQueriesContext(connection) as ctx:
+            user.save()
+        self.assertSingleUpdate(ctx.captured_queries, {'phone_number', 'updated_at'})
+
+
+class JSONRenderingTests(TestCase):
+    def test_read_serializer_matches_model_serializer(self):
+        user = User.objects.create_user(email='render@example.com', username='render', password='x')
+        self.assertEqual(UserReadSerializer(user).data, UserSerializer(user).data)
+
+    def test_orjson_output_matches_json_renderer_and_round_trips(self):
+        data = {
+            'name': 'Zoë\u2028line\u2029end',
+            'at': timezone.now(),
+            'id': uuid.uuid4(),
+            'amount': Decimal('1.50'),
+            'nested': [1, 2.5, None, True, {'empty': {}}],
+        }
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertNotIn('\u2028'.encode(), rendered)
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(rendered)), json.loads(rendered))
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(rendered))['name'], data['name'])
+
+
+@mock.patch.object(FailedLoginAttemptAdmin, 'list_per_page', 3)
+class KeysetAdminTests(TestCase):
+    url = '/admin/accounts/failedloginattempt/'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='admin-password'
+        ))
+        FailedLoginAttempt.objects.bulk_create(
+            FailedLoginAttempt(email=f'attempt{index}@example.com', ip_address='203.0.113.5') for index in range(7)
+        )
+        self.pks = list(FailedLoginAttempt.objects.order_by('-pk').values_list('pk', flat=True))
+
+    def test_pages_follow_the_primary_key_cursor(self):
+        pages, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(self.url, {'before': cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([query for query in captured if 'OFFSET' in query['sql']])
+            changelist = response.context['cl']
+            pages.append([row.pk for row in changelist.result_list])
+            cursor = changelist.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(pages, [self.pks[:3], self.pks[3:6], self.pks[6:]])
+        self.assertFalse(response.context['cl'].next_page_url)
+
+    def test_paginator_count_is_bounded(self):
+        paginator = EstimatedCountPaginator(FailedLoginAttempt.objects.filter(ip_address='203.0.113.5'), 3)
+        paginator.count_limit = 5
+        self.assertEqual(paginator.count, 5)
+        # No planner estimate outside PostgreSQL, so it counts up to the limit
+        self.assertEqual(EstimatedCountPaginator(FailedLoginAttempt.objects.all(), 3).count, 7)
+
+
+class RegistrationRollupTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.days = []
+        for index, (age, verified) in enumerate([(3, True), (3, False), (2, False)]):
+            user = User.objects.create_user(email=f'funnel{index}@example.com', username=f'funnel{index}', password='x')
+            registered_at = now - timedelta(days=age)
+            UserRegistrationInfo.objects.create(user=user, ip_address='203.0.113.1', user_agent='tests')
+            UserRegistrationInfo.objects.filter(user=user).update(
+                registered_at=registered_at, verified_at=registered_at + timedelta(hours=1) if verified else None,
+            )
+            self.days.append(timezone.localtime(registered_at).date())
+
+    def rollup(self, day):
+        return RegistrationDailyRollup.objects.filter(day=day).values_list('registrations', 'verified').get()
+
+    def test_refresh_recomputes_only_changed_days(self):
+        self.assertEqual(refresh_registration_rollups(), 2)
+        self.assertEqual(self.rollup(self.days[0]), (2, 1))
+        self.assertEqual(self.rollup(self.days[2]), (1, 0))
+        watermark = RollupWatermark.objects.get(name=REGISTRATION_FUNNEL).value
+        self.assertEqual(refresh_registration_rollups(), 0)
+
+        # A verification today touches only the day of the registration
+        UserRegistrationInfo.objects.filter(user__email='funnel1@example.com').update(verified_at=timezone.now())
+        self.assertEqual(refresh_registration_rollups(), 1)
+        self.assertEqual(self.rollup(self.days[0]), (2, 2))
+        self.assertGreater(RollupWatermark.objects.get(name=REGISTRATION_FUNNEL).value, watermark)
+
+    def test_on_commit_refresh_is_opt_in(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_registration_rollup_refresh()
+        self.assertEqual(callbacks, [])
+        with self.settings(ACCOUNTS_ROLLUP_ON_COMMIT=True), self.captureOnCommitCallbacks(execute=True):
+            schedule_registration_rollup_refresh()
+        self.assertEqual(RegistrationDailyRollup.objects.filter(day__in=self.days).count(), 2)
+
+    def funnel(self, user, **params):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get('/api/analytics/registration-funnel/', params, headers={'Authorization': f'Bearer {token}'})
+
+    def test_funnel_endpoint_totals_and_breakdowns(self):
+        refresh_registration_rollups()
+        admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='x')
+        response = self.funnel(admin, start=self.days[0].isoformat(), end=self.days[2].isoformat())
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['totals'], {'registrations': 3, 'verified': 1, 'conversion_rate': 0.3333})
+        self.assertEqual([day['registrations'] for day in data['days']], [2, 1])
+        self.assertEqual(data['by_source'], [
+            {'registration_source': 'web', 'registrations': 3, 'verified': 1, 'conversion_rate': 0.3333},
+        ])
+
+        self.assertEqual(self.funnel(User.objects.get(email='funnel0@example.com')).status_code, 403)
+
+
+class LastLoginBufferTests(TestCase):
+    def test_flush_writes_one_update_for_all_pending_logins(self):
+        users = [
+            User.objects.create_user(email=f'login{i}@example.com', username=f'login{i}', password='password')
+            for i in range(3)
+        ]
+        buffer = LastLoginBuffer(flush_interval=3600)
+        now = timezone.now()
+        for user in users:
+            buffer.record(user.pk, now)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(updated_columns(ctx.captured_queries[0]['sql']), {'last_login'})
+        self.assertEqual(User.objects.filter(last_login=now).count(), 3)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_async_login_flushes_a_full_buffer_off_the_event_loop(self):
+        user = User.objects.create_user(email='alogin@example.com', username='alogin', password='correct-horse')
+        request = AsyncRequestFactory().post(
+            '/', json.dumps({'email': 'alogin@example.com', 'password': 'correct-horse'}),
+            content_type='application/json',
+        )
+        with self.settings(ACCOUNTS_BATCH_LAST_LOGIN=True), \
+                mock.patch.object(last_login_buffer, 'max_pending', 1):
+            response = async_to_sync(AsyncTokenObtainPairView.as_view())(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(User.objects.get(pk=user.pk).last_login)
+
+    def test_failed_flush_keeps_pending_logins(self):
+        buffer = LastLoginBuffer(flush_interval=3600)
+        buffer.record(1, timezone.now())
+        with mock.patch.object(User.objects, 'filter', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(list(buffer._pending), [1])
+        buffer._pending.clear()
+
+
+class AdmissionControlTests(SimpleTestCase):
+    def setUp(self):
+        self.controller = AdmissionController({'MAX_IN_FLIGHT': 4, 'LOW_SHARE': 0.5, 'QUEUE_TIMEOUT': 0})
+
+    def test_paths_are_classified_by_prefix(self):
+        self.assertEqual(self.controller.classify('/api/token/refresh/'), CRITICAL)
+        self.assertEqual(self.controller.classify('/api/register/'), LOW)
+        self.assertEqual(self.controller.classify('/api/reset-password/'), 'normal')
+
+    def test_low_priority_is_shed_first(self):
+        self.assertTrue(self.controller.admit(LOW))
+        self.assertTrue(self.controller.admit(LOW))
+        self.assertFalse(self.controller.admit(LOW))
+        self.assertTrue(self.controller.admit('normal'))
+        self.assertTrue(self.controller.admit('normal'))
+        self.assertFalse(self.controller.admit('normal'))
+        self.assertTrue(self.controller.admit(CRITICAL))
+        self.assertEqual(self.controller.snapshot()['shed'], {CRITICAL: 0, 'normal': 1, LOW: 1})
+
+    def test_low_priority_is_shed_while_latency_is_over_target(self):
+        self.controller.admit(CRITICAL)
+        self.controller.release(CRITICAL, elapsed=10)
+        self.assertFalse(self.controller.admit(LOW))
+
+    def test_low_priority_is_admitted_again_after_a_quiet_period(self):
+        now = [0.0]
+        controller = AdmissionController({'QUEUE_TIMEOUT': 0, 'LATENCY_HALF_LIFE': 5}, clock=lambda: now[0])
+        controller.admit(CRITICAL)
+        controller.release(CRITICAL, elapsed=10)
+        self.assertFalse(controller.admit(LOW))
+        now[0] += 60
+        self.assertTrue(controller.admit(LOW))
+
+    def test_login_latency_does_not_shed_signups(self):
+        middleware = AdmissionControlMiddleware(lambda request: time.sleep(0.01) or HttpResponse(), self.controller)
+        self.controller.config['LATENCY_TARGET'] = 0.005
+        for _ in range(5):
+            middleware(RequestFactory().post('/api/login/'))
+        self.assertEqual(self.controller.snapshot()['latency_ewma'], 0)
+        self.assertEqual(middleware(RequestFactory().post('/api/register/')).status_code, 200)
+
+    def test_shed_request_gets_503_with_retry_after(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse(), self.controller)
+        self.controller.admit(LOW)
+        self.controller.admit(LOW)
+        response = middleware(RequestFactory().post('/api/register/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(middleware(RequestFactory().post('/api/token/refresh/')).status_code, 200)
+
+
+class ClientIPResolverTests(SimpleTestCase):
+    def setUp(self):
+        self.resolve = ClientIPResolver(['10.0.0.0/8', '2001:db8::/32']).resolve
+
+    def test_untrusted_peer_ignores_forwarded_for(self):
+        self.assertEqual(self.resolve('203.0.113.9', '198.51.100.1'), '203.0.113.9')
+
+    def test_walks_chain_to_first_untrusted_hop(self):
+        self.assertEqual(self.resolve('10.0.0.1', '198.51.100.1, 203.0.113.9, 10.1.2.3'), '203.0.113.9')
+
+    def test_all_trusted_returns_leftmost(self):
+        self.assertEqual(self.resolve('10.0.0.1', '10.9.9.9, 10.1.2.3'), '10.9.9.9')
+
+    def test_invalid_hop_stops_at_last_trusted(self):
+        self.assertEqual(self.resolve('10.0.0.1', 'nonsense, 10.1.2.3'), '10.1.2.3')
+
+    def test_addresses_are_normalized(self):
+        self.assertEqual(self.resolve('10.0.0.1', '[2001:DB9:0::1]:443'), '2001:db9::1')
+        self.assertEqual(self.resolve('::ffff:203.0.113.9', None), '203.0.113.9')
+        self.assertEqual(self.resolve('10.0.0.1', '203.0.113.9:5000'), '203.0.113.9')
+
+    def test_empty_proxy_entries_are_skipped(self):
+        resolve = ClientIPResolver('10.0.0.0/8,'.split(',')).resolve
+        self.assertEqual(resolve('10.0.0.1', '203.0.113.9'), '203.0.113.9')
+
+    def test_missing_address_resolves_to_unknown_ip(self):
+        self.assertEqual(self.resolve(None, None), UNKNOWN_IP)
+        self.assertEqual(self.resolve('', 'nonsense'), UNKNOWN_IP)
+        self.assertEqual(LockoutEngine().scopes('someone@example.com', UNKNOWN_IP, LockoutEngine().config)[1:], [])
+
+
+class VerificationTokenTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = encode_verification_token(42, 'someone+tag@example.com')
+        self.assertEqual(
+            decode_verification_token(token),
+            {'user_id': 42, 'email': 'someone+tag@example.com'}
+        )
+
+    def test_legacy_compressed_tokens_are_accepted(self):
+        token = signing.dumps({'user_id': 7, 'email': 'old@example.com'}, salt=VERIFICATION_SALT, compress=True)
+        self.assertEqual(decode_verification_token(token), {'user_id': 7, 'email': 'old@example.com'})
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        token = encode_verification_token(42, 'someone@example.com')
+        with self.assertRaises(signing.BadSignature):
+            decode_verification_token(token.replace('42.', '43.', 1))
+        with self.assertRaises(signing.SignatureExpired):
+            decode_verification_token(token, max_age=-1)
+
+
+class VerifyEmailConfirmTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='verify@example.com', username='verify', password='x')
+        UserRegistrationInfo.objects.create(user=self.user, ip_address='203.0.113.1', user_agent='tests')
+        self.token = encode_verification_token(self.user.pk, self.user.email)
+
+    def click(self, token=None):
+        response = self.client.get('/api/verify-email/confirm/', {'token': token or self.token})
+        return response['Location'].rsplit('/', 1)[-1]
+
+    def test_link_verifies_once(self):
+        self.assertEqual(self.click(), 'success')
+        registration = UserRegistrationInfo.objects.get(user=self.user)
+        self.assertEqual(registration.registration_status, 'verified')
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_email_verified)
+
+        # Replays are answered from the used-token set
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.click(), 'already-verified')
+        self.assertEqual(len(captured), 0)
+
+        # Without it, the conditional UPDATE still matches nothing
+        cache.clear()
+        self.assertEqual(self.click(), 'already-verified')
+        self.assertEqual(UserRegistrationInfo.objects.get(user=self.user).verified_at, registration.verified_at)
+
+    def test_bad_links_are_rejected(self):
+        self.assertEqual(self.click(self.token.replace(f'{self.user.pk}.', f'{self.user.pk + 1}.', 1)), 'error')
+        self.assertEqual(self.click(encode_verification_token(self.user.pk, 'other@example.com')), 'error')
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_email_verified)
+
+
+class WarmupTests(SimpleTestCase):
+    def test_device_info_is_parsed_once_per_user_agent(self):
+        iphone, chrome = SAMPLE_USER_AGENTS[1], SAMPLE_USER_AGENTS[0]
+        info = get_device_info(iphone)
+        self.assertEqual(info['device_type'], 'mobile')
+        self.assertTrue(info['os_type'].startswith('iOS'))
+        self.assertEqual(get_device_info(chrome)['device_type'], 'desktop')
+
+        hits = _parse_device_info.cache_info().hits
+        self.assertEqual(get_device_info(iphone), info)
+        self.assertEqual(_parse_device_info.cache_info().hits, hits + 1)
+
+    def test_warm_builds_the_lazy_state(self):
+        verification_email_templates.cache_clear()
+        with self.settings(JWT_KEYS_DIR=None):
+            timings = warm()
+        self.assertLessEqual({'user_agents', 'templates', 'urls'}, set(timings))
+        self.assertEqual(verification_email_templates.cache_info().currsize, 1)
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+
+class FailedLoginCounterTests(TestCase):
+    def test_failures_share_a_bucket_row(self):
+        for _ in range(3):
+            record_failed_login(' Victim@Example.com', '203.0.113.9')
+        record_failed_login('victim@example.com', '198.51.100.1')
+
+        self.assertEqual(FailedLoginCounter.objects.count(), 2)
+        since = timezone.now() - timedelta(hours=1)
+        self.assertEqual(failures_since(since, email='victim@example.com'), 4)
+        self.assertEqual(failures_since(since, ip_address='203.0.113.9'), 3)
+
+    def test_lockout_counters_are_seeded_from_history_after_cache_loss(self):
+        engine = LockoutEngine(cache=caches['default'], history=failures_since)
+        for _ in range(4):
+            record_failed_login('victim@example.com', '203.0.113.9')
+        caches['default'].clear()
+
+        # Fifth failure overall reaches ACCOUNT_THRESHOLD despite the empty cache
+        self.assertGreater(engine.register_failure('victim@example.com', '198.51.100.1'), 0)
+
+    def test_migration_folds_attempts_into_bucket_counters(self):
+        fold = import_module('accounts.migrations.0005_failed_login_counters').fold_failed_login_attempts
+        start = datetime(2026, 10, 19, 11, 0, tzinfo=dt_timezone.utc)
+        attempts = [
+            ('Victim@Example.com ', '203.0.113.9', start),
+            ('victim@example.com', '203.0.113.9', start + timedelta(minutes=4)),
+            ('victim@example.com', '203.0.113.9', start + timedelta(minutes=5)),
+            ('victim@example.com', '198.51.100.1', start + timedelta(minutes=1)),
+            ('VICTIM@example.com', '203.0.113.9', start + timedelta(minutes=2)),
+        ]
+        for email, ip_address, timestamp in attempts:
+            attempt = FailedLoginAttempt.objects.create(email=email, ip_address=ip_address)
+            FailedLoginAttempt.objects.filter(pk=attempt.pk).update(timestamp=timestamp)
+
+        schema_editor = mock.Mock(connection=connection, quote_name=connection.ops.quote_name)
+        fold(apps, schema_editor, chunk_size=2)
+        self.assertEqual(
+            set(FailedLoginCounter.objects.values_list('email', 'ip_address', 'bucket', 'count')),
+            {
+                ('victim@example.com', '203.0.113.9', start, 3),
+                ('victim@example.com', '203.0.113.9', start + timedelta(minutes=5), 1),
+                ('victim@example.com', '198.51.100.1', start, 1),
+            },
+        )
+
+
+@override_settings(ACCOUNT_LOCKOUT={
+    'ACCOUNT_THRESHOLD': 3, 'IP_THRESHOLD': 5, 'NETWORK_THRESHOLD': 1000, 'BASE_DELAY': 60, 'MAX_DELAY': 300,
+})
+class LockoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        lockout.local.clear()
+        self.engine = LockoutEngine(cache=caches['default'])
+        self.user = User.objects.create_user(email='locked@example.com', username='locked', password='correct-horse')
+
+    def login(self, password, ip_address='198.51.100.20'):
+        return self.client.post(
+            '/api/login/', {'email': 'locked@example.com', 'password': password},
+            content_type='application/json', REMOTE_ADDR=ip_address,
+        )
+
+    def test_login_view_refuses_with_retry_after_once_locked(self):
+        self.assertEqual([self.login('wrong').status_code for _ in range(2)], [401, 401])
+        locked = self.login('wrong')
+        self.assertEqual(locked.status_code, 429)
+        self.assertEqual(locked['Retry-After'], '60')
+        # Even the right password waits out the lock
+        self.assertEqual(self.login('correct-horse').status_code, 429)
+
+    def test_delay_doubles_per_failure_up_to_max_delay(self):
+        delays = [
+            self.engine.register_failure('locked@example.com', f'198.51.{attempt}.1') for attempt in range(7)
+        ]
+        self.assertEqual(delays, [0, 0, 60, 120, 240, 300, 300])
+
+    def test_ip_and_account_scopes_lock_independently(self):
+        for attempt in range(5):
+            self.engine.register_failure(f'user{attempt}@example.com', '198.51.100.20')
+        self.assertGreater(self.engine.retry_after('fresh@example.com', '198.51.100.20'), 0)
+        self.assertEqual(self.engine.retry_after('fresh@example.com', '203.0.113.1'), 0)
+
+        for attempt in range(3):
+            self.engine.register_failure('locked@example.com', f'192.0.2.{attempt}')
+        self.assertGreater(self.engine.retry_after('locked@example.com', '203.0.113.1'), 0)
+        self.assertEqual(self.engine.retry_after('other@example.com', '192.0.2.1'), 0)
+
+    def test_reset_clears_only_the_account_scope(self):
+        for attempt in range(5):
+            self.engine.register_failure('locked@example.com', '198.51.100.20')
+        self.engine.reset('locked@example.com')
+
+        self.assertEqual(self.engine.retry_after('locked@example.com', '203.0.113.1'), 0)
+        self.assertGreater(self.engine.retry_after('locked@example.com', '198.51.100.20'), 0)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.job('tests.record')(lambda **payload: self.calls.append(payload))
+        jobs.job('tests.fail', max_attempts=2)(lambda: 1 / 0)
+        self.addCleanup(jobs.REGISTRY.pop, 'tests.record')
+        self.addCleanup(jobs.REGISTRY.pop, 'tests.fail')
+
+    def test_claimed_jobs_run_once(self):
+        jobs.enqueue('tests.record', {'n': 1})
+        jobs.enqueue('tests.record', {'n': 2}, delay=timedelta(hours=1))
+
+        self.assertEqual(jobs.work(['default']), 1)
+        self.assertEqual(self.calls, [{'n': 1}])
+        self.assertEqual(jobs.claim(['default']), [])
+        self.assertEqual(jobs.queue_stats()['default']['scheduled'], 1)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        failing = jobs.enqueue('tests.fail', max_attempts=2)
+        jobs.run(jobs.claim(['default'])[0])
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.QUEUED, 1))
+
+        Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+        jobs.run(jobs.claim(['default'])[0])
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, Job.FAILED)
+        self.assertIn('ZeroDivisionError', failing.last_error)
+
+    def test_unique_key_allows_one_pending_job(self):
+        self.assertIsNotNone(jobs.enqueue('tests.record', unique_key='only-one'))
+        self.assertIsNone(jobs.enqueue('tests.record', unique_key='only-one'))
+        jobs.work(['default'])
+        self.assertIsNotNone(jobs.enqueue('tests.record', unique_key='only-one'))
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        retried = jobs.enqueue('tests.record')
+        exhausted = jobs.enqueue('tests.record', max_attempts=1)
+        alive = jobs.enqueue('tests.record')
+        self.assertEqual(len(jobs.claim(['default'], limit=3)), 3)
+        # The first two lost their worker; the third keeps its heartbeat fresh
+        Job.objects.filter(pk__in=[retried.pk, exhausted.pk]).update(
+            heartbeat_at=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1)
+        )
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[retried.pk], Job.QUEUED)
+        self.assertEqual(statuses[exhausted.pk], Job.FAILED)
+        self.assertEqual(statuses[alive.pk], Job.RUNNING)
+
+    def test_queued_mail_is_reported_as_queued(self):
+        user = User.objects.create_user(email='queued@example.com', username='queued', password='x')
+        with self.settings(ACCOUNTS_MAIL_VIA_JOBS=True):
+            email_status, _ = send_verification_email(user)
+        self.assertEqual(email_status, 'queued')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(Job.objects.filter(queue='mail', status=Job.QUEUED).exists())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Ids cached by earlier tests point at rolled-back users
+        user_id_by_email.local.clear()
+        self.user = User.objects.create_user(email='idem@example.com', username='idem', password='x')
+
+    def forgot_password(self, email='idem@example.com', key='retry-1'):
+        return self.client.post(
+            '/api/forgot-password/', {'email': email},
+            content_type='application/json', headers={'Idempotency-Key': key},
+        )
+
+    def test_retry_is_replayed_without_debug_info(self):
+        with self.settings(DEBUG=True):
+            first = self.forgot_password()
+            self.assertIn('reset_link', first.json()['debug_info'])
+            replayed = self.forgot_password()
+
+        self.assertEqual(replayed.status_code, first.status_code)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertNotIn('debug_info', replayed.json())
+        self.assertEqual(replayed.json()['message'], first.json()['message'])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_key_reused_for_another_body_is_rejected(self):
+        self.forgot_password()
+        self.assertEqual(self.forgot_password(email='other@example.com').status_code, 422)
+
+    def test_concurrent_duplicate_gets_conflict(self):
+        request = RequestFactory().post('/api/forgot-password/')
+        held = IdempotentRequest('retry-1', request)
+        cache.add(held.lock_key, held.lock_token)
+
+        response = self.forgot_password()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(mail.outbox), 0)
+        # A finished duplicate does not release a lock it no longer holds
+        self.assertEqual(cache.get(held.lock_key), held.lock_token)
+
+
+class AsyncViewParityTests(TestCase):
+    """The ASGI views answer exactly like the DRF views they replace"""
+
+    views = {
+        'register': (RegisterView, AsyncRegisterView),
+        'login': (CustomTokenObtainPairView, AsyncTokenObtainPairView),
+        'forgot-password': (ForgotPasswordView, AsyncForgotPasswordView),
+    }
+
+    def setUp(self):
+        self.forget_failures()
+        self.user = User.objects.create_user(email='parity@example.com', username='parity', password='correct-horse')
+
+    def forget_failures(self):
+        # Lockouts are seeded from the recorded failures, so drop those too
+        cache.clear()
+        lockout.local.clear()
+        user_id_by_email.local.clear()
+        FailedLoginCounter.objects.all().delete()
+
+    def post(self, view, use_async, data, **headers):
+        sync_view, async_view = self.views[view]
+        factory, view = (AsyncRequestFactory, async_view) if use_async else (RequestFactory, sync_view)
+        request = factory().post(
+            f'/{"async" if use_async else "sync"}/{view.__name__}/', json.dumps(data),
+            content_type='application/json', headers=headers,
+        )
+        if use_async:
+            return async_to_sync(view.as_view())(request)
+        return view.as_view()(request).render()
+
+    def both(self, view, data, **headers):
+        """(sync, async) responses, each starting from the same cache state"""
+        responses = []
+        for use_async in (False, True):
+            self.forget_failures()
+            responses.append(self.post(view, use_async, data, **headers))
+        return responses
+
+    def assertSameAnswer(self, sync_response, async_response):
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+
+    def test_register(self):
+        for use_async in (False, True):
+            response = self.post('register', use_async, {
+                'email': f'new{use_async:d}@example.com', 'username': f'new{use_async:d}',
+                'password': 'long-enough', 'password_confirm': 'long-enough',
+            })
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(set(json.loads(response.content)), {'message', 'email_status'})
+            self.assertTrue(UserRegistrationInfo.objects.filter(user__email=f'new{use_async:d}@example.com').exists())
+        self.assertEqual(len(mail.outbox), 2)
+
+        sync_response, async_response = self.both('register', {
+            'email': 'parity@example.com', 'username': 'parity',
+            'password': 'long-enough', 'password_confirm': 'long-enough',
+        })
+        self.assertEqual((sync_response.status_code, async_response.status_code), (400, 400))
+        self.assertEqual(set(json.loads(async_response.content)), set(json.loads(sync_response.content)))
+
+    def test_login_success_and_failure(self):
+        sync_response, async_response = self.both('login', {'email': 'parity@example.com', 'password': 'correct-horse'})
+        self.assertEqual((sync_response.status_code, async_response.status_code), (200, 200))
+        sync_data, async_data = json.loads(sync_response.content), json.loads(async_response.content)
+        self.assertEqual(set(async_data), set(sync_data))
+        self.assertEqual(async_data['user'], sync_data['user'])
+
+        self.assertSameAnswer(*self.both('login', {'email': 'parity@example.com', 'password': 'wrong'}))
+
+    def test_lockout(self):
+        answers = []
+        with self.settings(ACCOUNT_LOCKOUT={'ACCOUNT_THRESHOLD': 2, 'IP_THRESHOLD': 100}):
+            for use_async in (False, True):
+                self.forget_failures()
+                responses = [
+                    self.post('login', use_async, {'email': 'parity@example.com', 'password': 'wrong'})
+                    for attempt in range(3)
+                ]
+                answers.append([(response.status_code, response.get('Retry-After')) for response in responses])
+        self.assertEqual(answers[0], answers[1])
+        self.assertEqual([status_code for status_code, _ in answers[1]], [401, 429, 429])
+        self.assertGreater(int(answers[1][-1][1]), 0)
+
+    def test_forgot_password_idempotency(self):
+        for use_async in (False, True):
+            first, replayed = [
+                self.post('forgot-password', use_async, {'email': 'parity@example.com'}, **{'Idempotency-Key': 'key'})
+                for attempt in range(2)
+            ]
+            self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+            self.assertEqual(json.loads(replayed.content), json.loads(first.content))
+        # One email per implementation, none for the replays
+        self.assertEqual(len(mail.outbox), 2)
+
+        self.assertSameAnswer(*self.both('forgot-password', {'email': 'nobody@example.com'}))
+
+
+class StaticFilesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        css = Path(root.name, 'app.css')
+        css.write_text('body { color: black; }\n' * 100)
+        self.assertEqual([path.name for path in compress_file(css)], ['app.css.gz'])
+
+        with self.settings(STATIC_ROOT=root.name, STATIC_URL='/static/', ACCOUNTS_SERVE_STATIC=True):
+            self.middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+
+    def test_precompressed_variant_is_served_when_accepted(self):
+        response = self.middleware(RequestFactory().get('/static/app.css', headers={'Accept-Encoding': 'gzip, br'}))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).count(b'body'), 100)
+
+        plain = self.middleware(RequestFactory().get('/static/app.css'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+
+    def test_codings_refused_with_q_zero_are_not_served(self):
+        for header in ('gzip;q=0', 'gzip; q=0.0, identity', '*;q=0', 'br'):
+            with self.subTest(header):
+                response = self.middleware(RequestFactory().get('/static/app.css', headers={'Accept-Encoding': header}))
+                self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.middleware(RequestFactory().get('/static/app.css', headers={'Accept-Encoding': 'br;q=0, *;q=0.5'}))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_conditional_request_and_unknown_file(self):
+        etag = self.middleware(RequestFactory().get('/static/app.css'))['ETag']
+        response = self.middleware(RequestFactory().get('/static/app.css', headers={'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.middleware(RequestFactory().get('/static/missing.css')).status_code, 404)
+
+
+class SyntheticDataTests(TestCase):
+    def test_command_inserts_related_rows(self):
+        call_command(
+            'generate_synthetic_data', users=50, failed_logins=400, chunk_size=20, workers=1,
+            end=datetime(2026, 1, 1), stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(UserRegistrationInfo.objects.count(), 50)
+        pending = UserRegistrationInfo.objects.filter(registration_status='pending').count()
+        self.assertEqual(EmailVerificationToken.objects.count(), pending)
+        self.assertEqual(sum(FailedLoginCounter.objects.values_list('count', flat=True)), 400)
+        self.assertTrue(User.objects.filter(date_joined__lt=datetime(2026, 1, 1, tzinfo=dt_timezone.utc)).exists())
+
+    def test_failed_login_chunks_are_deterministic_and_disjoint(self):
+        options = Options(users=100, failed_logins=200, chunk_size=100, end=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        first = list(failed_login_events(options, 0, 2))
+        self.assertEqual(first, list(failed_login_events(options, 0, 2)))
+        self.assertEqual(len(first), 100)
+        emails = {email for email, _, _ in first}
+        self.assertFalse(emails & {email for email, _, _ in failed_login_events(options, 1, 2)})
+
+    def test_failed_login_rerun_adds_onto_existing_counters(self):
+        options = Options(users=100, failed_logins=200, chunk_size=100, end=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(generate_failed_logins(options, 0, 2), generate_failed_logins(options, 0, 2))
+        rows = FailedLoginCounter.objects.count()
+        self.assertEqual(sum(FailedLoginCounter.objects.values_list('count', flat=True)), 200)
+        generate_failed_logins(options, 0, 2)
+        self.assertEqual(FailedLoginCounter.objects.count(), rows)
+        self.assertEqual(sum(FailedLoginCounter.objects.values_list('count', flat=True)), 300)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'query plans are checked on PostgreSQL only')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_synthetic_data', users=20_000, failed_logins=200_000, workers=1, stdout=io.StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.sample = query_plans.sample_values()
+
+    def test_hot_queries_use_their_indexes(self):
+        results = []
+        for query in query_plans.HOT_QUERIES:
+            with self.subTest(query.name):
+                result = query_plans.check(query, self.sample)
+                results.append(result)
+                self.assertEqual(result['problems'], [], '\n'.join(result['shape']))
+
+        if query_plans.update_snapshots_requested():
+            query_plans.save_snapshots(results)
+        snapshots = query_plans.load_snapshots()
+        missing = sorted(result['name'] for result in results if result['name'] not in snapshots)
+        self.assertEqual(missing, [], 'No plan snapshot; record it with ACCOUNTS_UPDATE_PLAN_SNAPSHOTS=1')
+        for result in results:
+            with self.subTest(result['name']):
+                self.assertEqual(
+                    result['indexes'], snapshots[result['name']]['indexes'], '\n'.join(result['shape'])
+                )
+
+
+class ResendVerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for index in range(5):
+            user = User.objects.create_user(
+                email=f'pending{index}@example.com', username=f'pending{index}', password='resend-password'
+            )
+            UserRegistrationInfo.objects.create(user=user, ip_address='203.0.113.1', user_agent='tests')
+            self.users.append(user)
+        User.objects.filter(pk=self.users[0].pk).update(is_email_verified=True)
+
+    def test_endpoint_mails_once_per_cooldown(self):
+        for _ in range(2):
+            response = self.client.post('/api/resend-verification/', {'email': 'pending1@example.com'})
+            self.assertEqual(response.status_code, 200)
+        unknown = self.client.post('/api/resend-verification/', {'email': 'nobody@example.com'})
+        self.assertEqual(unknown.json()['message'], response.json()['message'])
+
+        self.assertEqual([message.to for message in mail.outbox], [['pending1@example.com']])
+        self.assertIn('verify-email/confirm/?token=', mail.outbox[0].body)
+        self.assertEqual(UserRegistrationInfo.objects.get(user=self.users[1]).verification_attempts, 1)
+
+    def test_bulk_resend_pages_pending_users_and_skips_cooldown(self):
+        resend_verification([User.objects.get(pk=self.users[2].pk)])
+        batches = list(pending_batches(batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+
+        output = io.StringIO()
+        call_command('resend_verification', batch_size=2, min_age=0, stdout=output)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox[1:]),
+            ['pending1@example.com', 'pending3@example.com', 'pending4@example.com'],
+        )
+        self.assertIn('1 skipped by cooldown', output.getvalue())
+
+    def test_dry_run_limit_counts_selected_users(self):
+        output = io.StringIO()
+        call_command('resend_verification', batch_size=2, min_age=0, limit=3, dry_run=True, stdout=output)
+        self.assertIn('3 pending user(s) would be considered', output.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_failed_batch_is_reported_and_the_run_continues(self):
+        real_deliver = deliver_mail_batch
+        calls = []
+
+        def flaky_deliver(messages):
+            calls.append(len(messages))
+            if len(calls) == 1:
+                raise smtplib.SMTPServerDisconnected('connection lost')
+            return real_deliver(messages)
+
+        output, errors = io.StringIO(), io.StringIO()
+        with mock.patch('accounts.resend.deliver_mail_batch', flaky_deliver):
+            call_command('resend_verification', batch_size=2, min_age=0, stdout=output, stderr=errors)
+        self.assertEqual(calls, [2, 2])
+        self.assertIn('connection lost', errors.getvalue())
+        self.assertIn('2 failed', output.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+        # The failed batch can be retried straight away
+        call_command('resend_verification', batch_size=2, min_age=0, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_queued_resend_retries_only_the_failed_message(self):
+        with self.settings(ACCOUNTS_MAIL_VIA_JOBS=True):
+            mailed = resend_verification(User.objects.filter(pk__in=[user.pk for user in self.users[1:]]))
+        self.assertEqual(len(mailed), 4)
+        self.assertEqual(Job.objects.filter(name='accounts.send_mail', queue='mail').count(), 4)
+
+        real_send_mail = mail.send_mail
+        calls = []
+
+        def flaky_send_mail(*args, **kwargs):
+            calls.append(kwargs['recipient_list'])
+            if len(calls) == 2:
+                raise smtplib.SMTPServerDisconnected('connection lost')
+            return real_send_mail(*args, **kwargs)
+
+        with mock.patch('accounts.tasks.send_mail', flaky_send_mail):
+            self.assertEqual(jobs.work(['mail'], batch_size=10), 4)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertNotIn(calls[1], [message.to for message in mail.outbox])
+        retried = Job.objects.get(status=Job.QUEUED)
+        self.assertEqual(retried.payload['recipient_list'], calls[1])
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache('tests', l1_ttl=60)
+        self.addCleanup(REGISTRY.pop, 'tests', None)
+        self.addCleanup(REGISTRY.pop, 'tests-refresh', None)
+        self.loads = []
+
+    def loader(self, value):
+        def load():
+            self.loads.append(value)
+            return value
+        return load
+
+    def test_loads_once_then_serves_from_l1(self):
+        self.assertEqual(self.tiered.get_or_load('key', self.loader('a')), 'a')
+        self.assertEqual(self.tiered.get_or_load('key', self.loader('b')), 'a')
+        self.tiered.local.clear()
+        self.assertEqual(self.tiered.get_or_load('key', self.loader('c')), 'a')
+        self.assertEqual(self.loads, ['a'])
+        stats = self.tiered.stats()
+        self.assertEqual((stats['l1_hits'], stats['l2_hits'], stats['misses']), (1, 1, 1))
+
+    def test_invalidation_rejects_loads_started_before_it(self):
+        self.tiered.get_or_load('key', self.loader('old'))
+
+        def slow_load():
+            # A write that lands after another worker invalidated the key
+            self.tiered.invalidate('key')
+            return 'stale'
+
+        self.tiered.invalidate('key')
+        self.assertEqual(self.tiered.get_or_load('key', slow_load), 'stale')
+        self.tiered.local.clear()
+        self.assertEqual(self.tiered.get_or_load('key', self.loader('new')), 'new')
+
+    def test_early_refresh_reloads_while_entry_is_valid(self):
+        tiered = TieredCache('tests-refresh', l1_size=0, early_refresh=0)
+        tiered.get_or_load('key', self.loader('first'))
+        self.assertEqual(tiered.get_or_load('key', self.loader('second')), 'second')
+        self.assertEqual(tiered.stats()['early_refreshes'], 1)
+
+    def test_lockout_serves_known_locks_locally(self):
+        engine = LockoutEngine(cache=caches['default'], local=LocalCache())
+        with self.settings(ACCOUNT_LOCKOUT={'ACCOUNT_THRESHOLD': 1}):
+            self.assertGreater(engine.register_failure('locked@example.com', '198.51.100.7'), 0)
+            caches['default'].clear()
+            self.assertGreater(engine.retry_after('locked@example.com', '198.51.100.7'), 0)
+            self.assertEqual(engine.retry_after('other@example.com', '198.51.100.8'), 0)
+
+    def test_user_changes_invalidate_cached_payloads(self):
+        profile_cache.local.clear()
+        user_id_by_email.local.clear()
+        self.assertIsNone(user_id_by_email.get_or_load('cached@example.com', lambda: None))
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(email='cached@example.com', username='cached', password='cache-password')
+        self.assertEqual(user_id_by_email.get_or_load('cached@example.com', lambda: user.pk), user.pk)
+
+        profile_cache.get_or_load(user.pk, lambda: {'username': 'cached'})
+        user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(profile_cache.get_or_load(user.pk, lambda: {'username': 'renamed'}), {'username': 'renamed'})
+
+    def test_no_op_and_login_saves_keep_cached_payloads(self):
+        user = User.objects.create_user(email='kept@example.com', username='kept', password='cache-password')
+        user = User.objects.get(pk=user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.save()
+            user.last_login = timezone.now()
+            user.save()
+        self.assertEqual(callbacks, [])
+
+    def test_deleting_a_user_forgets_its_email(self):
+        user_id_by_email.local.clear()
+        user = User.objects.create_user(email='gone@example.com', username='gone', password='cache-password')
+        self.assertEqual(user_id_by_email.get_or_load('gone@example.com', lambda: user.pk), user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertIsNone(user_id_by_email.get_or_load('gone@example.com', lambda: None))
+
+    def test_async_lookup_serves_hits_without_queries(self):
+        user_id_by_email.local.clear()
+        user = User.objects.create_user(email='aforgot@example.com', username='aforgot', password='cache-password')
+
+        def loader():
+            return User.objects.filter(email='aforgot@example.com').values_list('id', flat=True).first()
+
+        self.assertEqual(async_to_sync(user_id_by_email.aget_or_load)('aforgot@example.com', loader), user.pk)
+
+        user_id_by_email.local.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(async_to_sync(user_id_by_email.aget_or_load)('aforgot@example.com', loader), user.pk)
+        self.assertEqual(len(captured), 0)
+
+    def test_forgot_password_uses_the_cached_user_id(self):
+        user_id_by_email.local.clear()
+        user = User.objects.create_user(email='forgot@example.com', username='forgot', password='cache-password')
+        user_id_by_email.get_or_load('forgot@example.com', lambda: user.pk)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/forgot-password/', {'email': 'forgot@example.com'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        user_queries = [query['sql'] for query in captured if 'FROM "accounts_user"' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('"accounts_user"."id" =', user_queries[0])
+
+
+class KeyRotatingTokenBackendTests(SimpleTestCase):
+    def setUp(self):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+
+        keys_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(keys_dir.cleanup)
+        for kid in ('2024-01', '2024-02'):
+            pem = ed25519.Ed25519PrivateKey.generate().private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+            )
+            Path(keys_dir.name, f'{kid}.pem').write_bytes(pem)
+        self.keys_dir = keys_dir.name
+        self.clear_key_caches()
+        self.addCleanup(self.clear_key_caches)
+
+    @staticmethod
+    def clear_key_caches():
+        get_signing_keys.cache_clear()
+        get_jwks_document.cache_clear()
+
+    def backend(self, active_kid=None, **settings):
+        with self.settings(JWT_KEYS_DIR=self.keys_dir, JWT_ACTIVE_KID=active_kid, **settings):
+            return KeyRotatingTokenBackend()
+
+    def payload(self, **claims):
+        now = int(timezone.now().timestamp())
+        return {'user_id': 1, 'token_type': 'access', 'iat': now, 'exp': now + 300, **claims}
+
+    def test_signs_with_active_key_and_verifies(self):
+        import jwt
+
+        backend = self.backend('2024-01')
+        token = backend.encode(self.payload())
+        self.assertEqual(jwt.get_unverified_header(token)['kid'], '2024-01')
+        self.assertEqual(backend.decode(token)['user_id'], 1)
+
+    def test_tokens_of_previous_key_verify_after_rotation(self):
+        import jwt
+
+        old_token = self.backend('2024-01').encode(self.payload())
+        rotated = self.backend('2024-02')
+        self.assertEqual(rotated.decode(old_token)['user_id'], 1)
+        self.assertEqual(jwt.get_unverified_header(rotated.encode(self.payload()))['kid'], '2024-02')
+
+    def test_unknown_kid_is_rejected(self):
+        import jwt
+        from rest_framework_simplejwt.exceptions import TokenBackendError
+
+        backend = self.backend()
+        _, private_key = backend.keys['2024-01']
+        token = jwt.encode(self.payload(), private_key, algorithm='EdDSA', headers={'kid': 'retired'})
+        with self.assertRaises(TokenBackendError):
+            backend.decode(token)
+
+    def test_jwks_document_lists_public_keys(self):
+        with self.settings(JWT_KEYS_DIR=self.keys_dir):
+            body, etag = get_jwks_document()
+            response = self.client.get('/api/.well-known/jwks.json')
+        keys = json.loads(body)['keys']
+        self.assertEqual([key['kid'] for key in keys], ['2024-01', '2024-02'])
+        self.assertTrue(all(key['alg'] == 'EdDSA' and key['use'] == 'sig' and 'd' not in key for key in keys))
+        self.assertEqual(response['ETag'], etag)
+
+    def test_legacy_tokens_are_rejected_outside_the_cutover_window(self):
+        import jwt
+        from django.conf import settings
+        from rest_framework_simplejwt.exceptions import TokenBackendError
+
+        now = timezone.now()
+        long_lived = jwt.encode(
+            self.payload(iat=int((now - timedelta(hours=1)).timestamp()), exp=int(now.timestamp()) + 10 ** 8),
+            settings.SECRET_KEY, algorithm='HS256',
+        )
+        minted_after = jwt.encode(self.payload(), settings.SECRET_KEY, algorithm='HS256')
+        recent_cutover = (now - timedelta(minutes=30)).isoformat()
+        old_cutover = (now - timedelta(days=30)).isoformat()
+
+        with self.assertRaises(TokenBackendError):
+            self.backend().decode(long_lived)
+        with self.assertRaises(TokenBackendError):
+            self.backend(JWT_LEGACY_CUTOVER=old_cutover).decode(long_lived)
+        with self.assertRaises(TokenBackendError):
+            self.backend(JWT_LEGACY_CUTOVER=recent_cutover).decode(minted_after)
+        self.assertEqual(self.backend(JWT_LEGACY_CUTOVER=recent_cutover).decode(long_lived)['user_id'], 1)
@@ -0,0 +1,235 @@
+"""
+Two-tier caching: a bounded per-process LRU (L1) over the shared Django cache
+(L2).
+
+L1 entries live for a few seconds, so a hot key costs a dict lookup instead
+of a round trip to the shared backend, and another worker's write shows up
+here after at most `l1_ttl`. L2 entries carry the key's version; `invalidate()`
+bumps the version in L2, which makes every worker's next L2 read treat the old
+value as a miss, and also rejects writes from loads that started before the
+invalidation.
+
+Misses are single-flight: one thread per process (a striped lock) and one
+process per key (an `add()` lock in L2) runs the loader while the others wait
+for its result. Once an entry is `early_refresh` of the way through its TTL
+the first reader to take the lock reloads it and the rest keep being served
+the current value, so a hot key never expires under load.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+MISSING = object()
+LOCK_STRIPES = 64
+POLL_INTERVAL = 0.01
+
+# Caches by name, for `cache_stats()`
+REGISTRY = {}
+
+
+class LocalCache:
+    """Bounded, thread-safe LRU with a TTL per entry, private to the process"""
+
+    def __init__(self, maxsize=1024, ttl=5, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # {key: (monotonic expiry, value)}, least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        if name is not None:
+            REGISTRY[name] = self
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class TieredCache:
+    """
+    Values computed by `get_or_load(key, loader)`, cached in L1 for `l1_ttl`
+    and in `backend` (L2) for `ttl` seconds. `l1_size=0` turns L1 off.
+    """
+
+    def __init__(self, name, ttl=300, l1_ttl=5, l1_size=1024, early_refresh=0.8,
+                 lock_timeout=10, lock_wait=1.0, backend=cache):
+        self.name = name
+        self.ttl = ttl
+        self.early_refresh = early_refresh
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.backend = backend
+        self.local = LocalCache(l1_size, min(l1_ttl, ttl))
+        self.stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.metrics = Counter()
+        self.metrics_lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def count(self, metric):
+        with self.metrics_lock:
+            self.metrics[metric] += 1
+
+    def keys(self, key):
+        """(data, version, lock) keys of `key` in L2"""
+        base = f'tiered:{self.name}:{hashlib.sha1(str(key).encode()).hexdigest()[:24]}'
+        return base, base + ':v', base + ':lock'
+
+    def fetch(self, data_key, version_key):
+        """(L2 entry or None, current version); entries of older versions are misses"""
+        found = self.backend.get_many([data_key, version_key])
+        version = found.get(version_key, 0)
+        entry = found.get(data_key)
+        if entry is None or entry[0] != version:
+            return None, version
+        return entry, version
+
+    def get_or_load(self, key, loader):
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            self.count('l1_hits')
+            return value
+
+        data_key, version_key, lock_key = self.keys(key)
+        entry, version = self.fetch(data_key, version_key)
+        if entry is not None:
+            self.count('l2_hits')
+            _, refresh_at, value = entry
+            if time.time() >= refresh_at and self.backend.add(lock_key, 1, self.lock_timeout):
+                self.count('early_refreshes')
+                try:
+                    return self.load(key, loader, data_key, version, lock_key)
+                except Exception:
+                    # The entry is still valid for the rest of its TTL
+                    self.count('refresh_errors')
+            self.local.set(key, value)
+            return value
+
+        self.count('misses')
+        with self.stripes[hash(key) % LOCK_STRIPES]:
+            deadline = time.monotonic() + self.lock_wait
+            waited = False
+            while True:
+                # Another thread or process may have loaded it meanwhile
+                entry, version = self.fetch(data_key, version_key)
+                if entry is not None:
+                    self.local.set(key, entry[2])
+                    return entry[2]
+                if self.backend.add(lock_key, 1, self.lock_timeout):
+                    return self.load(key, loader, data_key, version, lock_key)
+                if time.monotonic() >= deadline:
+                    # The process holding the lock is slow or died
+                    self.count('lock_timeouts')
+                    return self.load(key, loader, data_key, version, None)
+                if not waited:
+                    self.count('lock_waits')
+                    waited = True
+                time.sleep(POLL_INTERVAL)
+
+    async def aget_or_load(self, key, loader):
+        """
+        Async counterpart of `get_or_load`. Hits are served on the event
+        loop; misses and due refreshes run `get_or_load` in a thread.
+        """
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            self.count('l1_hits')
+            return value
+
+        data_key, version_key, _ = self.keys(key)
+        found = await self.backend.aget_many([data_key, version_key])
+        entry = found.get(data_key)
+        if entry is not None and entry[0] == found.get(version_key, 0) and time.time() < entry[1]:
+            self.count('l2_hits')
+            self.local.set(key, entry[2])
+            return entry[2]
+        return await sync_to_async(self.get_or_load, thread_sensitive=True)(key, loader)
+
+    def load(self, key, loader, data_key, version, lock_key):
+        try:
+            value = loader()
+            self.count('loads')
+            refresh_at = time.time() + self.ttl * self.early_refresh
+            self.backend.set(data_key, (version, refresh_at, value), self.ttl)
+            self.local.set(key, value)
+            return value
+        finally:
+            if lock_key is not None:
+                self.backend.delete(lock_key)
+
+    def invalidate(self, key):
+        """Drop `key` here at once and, through its version, in every worker within l1_ttl"""
+        data_key, version_key, _ = self.keys(key)
+        self.local.delete(key)
+        try:
+            self.backend.incr(version_key)
+        except ValueError:
+            self.backend.set(version_key, 1, self.ttl * 2)
+        self.backend.delete(data_key)
+        self.count('invalidations')
+
+    def stats(self):
+        with self.metrics_lock:
+            metrics = dict(self.metrics)
+        hits = metrics.get('l1_hits', 0) + metrics.get('l2_hits', 0)
+        lookups = hits + metrics.get('misses', 0)
+        metrics['l1_size'] = len(self.local)
+        metrics['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        return metrics
+
+
+def cache_stats():
+    """Hit/miss counters of every named cache in this process"""
+    return {name: tiered.stats() for name, tiered in sorted(REGISTRY.items())}
+
+
+# UserReadSerializer payloads by user id
+profile_cache = TieredCache('profile', ttl=300)
+# User id, or None when there is no such user, by exact email address
+user_id_by_email = TieredCache('user-id-by-email', ttl=600)
+
+
+def invalidate_user(user_id, *emails):
+    """Drop a user's cached payloads once the current transaction commits"""
+    def invalidate():
+        profile_cache.invalidate(user_id)
+        for email in set(filter(None, emails)):
+            user_id_by_email.invalidate(email)
+    transaction.on_commit(invalidate)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
@@ -6,17 +7,46 @@ from .views import (
     UserProfileView,
     ForgotPasswordView,
     ResetPasswordView,
-    VerifyEmailConfirmView
+    ResendVerificationView,
+    VerifyEmailConfirmView,
+    RegistrationFunnelView,
+    AdmissionStatsView,
+    CacheStatsView,
+    JobStatsView,
+    JWKSView
 )
+from .async_views import (
+    AsyncRegisterView,
+    AsyncTokenObtainPairView,
+    AsyncForgotPasswordView,
+    AsyncResetPasswordView,
+    AsyncVerifyEmailConfirmView
+)
+
+
+def sync_or_async(name, sync_view, async_view):
+    """Serve URL `name` with the async view when listed in ACCOUNTS_ASYNC_VIEWS"""
+    if name in settings.ACCOUNTS_ASYNC_VIEWS:
+        return async_view.as_view()
+    return sync_view.as_view()
+
 
 urlpatterns = [
-    path('register/', RegisterView.as_view(), name='register'),
-    path('login/', CustomTokenObtainPairView.as_view(), name='login'),
+    path('register/', sync_or_async('register', RegisterView, AsyncRegisterView), name='register'),
+    path('login/', sync_or_async('login', CustomTokenObtainPairView, AsyncTokenObtainPairView), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     # path('verify-email/', VerifyEmailView.as_view(), name='verify-email'),
     path('profile/', UserProfileView.as_view(), name='profile'),
-    path('forgot-password/', ForgotPasswordView.as_view(), name='forgot-password'),
-    path('reset-password/', ResetPasswordView.as_view(), name='reset-password'),
+    path('forgot-password/', sync_or_async('forgot-password', ForgotPasswordView, AsyncForgotPasswordView), name='forgot-password'),
+    path('reset-password/', sync_or_async('reset-password', ResetPasswordView, AsyncResetPasswordView), name='reset-password'),
+
+     path('verify-email/confirm/', sync_or_async('verify-email-confirm', VerifyEmailConfirmView, AsyncVerifyEmailConfirmView), name='verify-email-confirm'),
+
+    path('resend-verification/', ResendVerificationView.as_view(), name='resend-verification'),
 
-     path('verify-email/confirm/', VerifyEmailConfirmView.as_view(), name='verify-email-confirm'),
-]
\ No newline at end of file
+    path('.well-known/jwks.json', JWKSView.as_view(), name='jwks'),
+    path('analytics/registration-funnel/', RegistrationFunnelView.as_view(), name='registration-funnel'),
+    path('admission/stats/', AdmissionStatsView.as_view(), name='admission-stats'),
+    path('jobs/stats/', JobStatsView.as_view(), name='job-stats'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+]
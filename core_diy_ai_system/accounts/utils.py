@@ -1,8 +1,16 @@
-from django.core.mail import send_mail
-from django.core import signing
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.urls import reverse
+from django.template.loader import get_template
+
+from .verification_tokens import VERIFICATION_MAX_AGE, build_verification_link
+
+# Seconds asend_mail waits on the SMTP server when EMAIL_TIMEOUT is unset
+SMTP_TIMEOUT = 10
 
 # def send_password_reset_email(email, reset_link):
 #     send_mail(
@@ -13,19 +21,53 @@ from django.urls import reverse
 #         fail_silently=False,
 #     )
 
+@functools.lru_cache(maxsize=1024)
+def _parse_device_info(user_agent_string):
+    # user_agents compiles the full ua-parser regex table on import (~150ms),
+    # so it is only loaded on the first signup or by accounts.warmup
+    from user_agents import parse
+
+    user_agent = parse(user_agent_string)
+    return (
+        ('device_type', 'mobile' if user_agent.is_mobile else 'tablet' if user_agent.is_tablet else 'desktop'),
+        ('os_type', f"{user_agent.os.family} {user_agent.os.version_string}"),
+        ('browser', f"{user_agent.browser.family} {user_agent.browser.version_string}"),
+    )
+
+
+def get_device_info(user_agent_string):
+    """Device type, OS and browser for a User-Agent header"""
+    return dict(_parse_device_info(user_agent_string))
+
+
+def _used_verification_token_key(token):
+    return 'accounts:verification-used:' + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def is_verification_token_used(token):
+    """Whether `token` has already been consumed, without touching the database"""
+    return cache.get(_used_verification_token_key(token)) is not None
+
+
+def mark_verification_token_used(token):
+    """
+    Record `token` as consumed. Entries expire together with the token itself,
+    so the used-token set never holds more than a day of verifications.
+    """
+    cache.set(_used_verification_token_key(token), 1, timeout=VERIFICATION_MAX_AGE)
+
+
+async def ais_verification_token_used(token):
+    return await cache.aget(_used_verification_token_key(token)) is not None
+
+
+async def amark_verification_token_used(token):
+    await cache.aset(_used_verification_token_key(token), 1, timeout=VERIFICATION_MAX_AGE)
+
+
 def generate_verification_link(user):
-    """Generate a signed verification token that expires in 24 hours"""
-    data = {
-        'user_id': user.id,
-        'email': user.email
-    }
-    # Create a signed token that expires in 24 hours (86400 seconds)
-    token = signing.dumps(data, salt='email-verification', compress=True)
-    
-    # Generate the full verification URL
-    verification_url = f"{settings.BACKEND_URL}{reverse('verify-email-confirm')}?token={token}"
-    
-    return verification_url
+    """Generate a signed verification link that expires in 24 hours"""
+    return build_verification_link(user)
 
 
 # def send_verification_email(user, token):
@@ -63,27 +105,179 @@ def generate_verification_link(user):
 #         print(f"Email sending failed: {str(e)}")  # Log this in production
 #         return False
 
-def send_verification_email(user):
+def mail_via_jobs():
+    return getattr(settings, 'ACCOUNTS_MAIL_VIA_JOBS', False)
+
+
+def delivered_status():
+    """`email_status` reported for mail that deliver_mail accepted"""
+    return 'queued' if mail_via_jobs() else 'sent'
+
+
+def deliver_mail(subject, message, from_email, recipient_list, html_message=None):
+    """
+    `send_mail`, or queue it for `manage.py run_jobs` when
+    ACCOUNTS_MAIL_VIA_JOBS is set so the request does not wait on SMTP.
+    """
+    if mail_via_jobs():
+        from .tasks import send_mail_job
+
+        send_mail_job.enqueue({
+            'subject': subject,
+            'message': message,
+            'from_email': from_email,
+            'recipient_list': list(recipient_list),
+            'html_message': html_message,
+        })
+        return 1
+    return send_mail(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        recipient_list=recipient_list,
+        html_message=html_message,
+        fail_silently=False,
+    )
+
+
+def deliver_mail_batch(messages):
+    """
+    Send `messages` (dicts of deliver_mail's arguments) over one mail
+    connection, or queue one job per message when ACCOUNTS_MAIL_VIA_JOBS is
+    set, so a retry after an SMTP error only re-sends the message that
+    failed.
+    """
+    if mail_via_jobs():
+        from .tasks import send_mail_job
+
+        send_mail_job.enqueue_many([
+            {
+                'subject': message['subject'],
+                'message': message['message'],
+                'from_email': message.get('from_email'),
+                'recipient_list': list(message['recipient_list']),
+                'html_message': message.get('html_message'),
+            }
+            for message in messages
+        ])
+        return len(messages)
+    return send_mail_batch(messages)
+
+
+def send_mail_batch(messages):
+    emails = []
+    for message in messages:
+        email = EmailMultiAlternatives(
+            message['subject'],
+            message['message'],
+            message.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            message['recipient_list'],
+        )
+        if message.get('html_message'):
+            email.attach_alternative(message['html_message'], 'text/html')
+        emails.append(email)
+    return get_connection(fail_silently=False).send_messages(emails)
+
+
+@functools.lru_cache(maxsize=None)
+def verification_email_templates():
+    """Compiled (plain, html) verification templates, shared by every send"""
+    return (
+        get_template('accounts/emails/verify_email.txt'),
+        get_template('accounts/emails/verify_email.html'),
+    )
+
+
+def build_verification_email(user):
+    """(verification link, plain text, html) of the verification email"""
     verification_link = generate_verification_link(user)
-    
     context = {
         'user': user,
         'verification_link': verification_link
     }
-    
-    html_message = render_to_string('accounts/emails/verify_email.html', context)
-    plain_message = render_to_string('accounts/emails/verify_email.txt', context)
+    plain_template, html_template = verification_email_templates()
+    return verification_link, plain_template.render(context), html_template.render(context)
+
+
+def send_verification_email(user):
+    """
+    ('sent' or 'queued', verification link), or ('failed', error message)
+    """
+    verification_link, plain_message, html_message = build_verification_email(user)
 
-    
     try:
-        send_mail(
+        deliver_mail(
             subject='Verify Your Email Address',
             message=plain_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email],
             html_message=html_message,
+        )
+        return delivered_status(), verification_link
+    except Exception as e:
+        return 'failed', str(e)
+
+
+async def asend_mail(subject, message, from_email, recipient_list, html_message=None):
+    """
+    Async counterpart of `send_mail`.
+
+    Talks SMTP from the event loop through aiosmtplib when it is installed
+    and the SMTP backend is configured; otherwise the regular backend runs
+    in a worker thread.
+    """
+    try:
+        import aiosmtplib
+    except ImportError:
+        aiosmtplib = None
+
+    if aiosmtplib is None or settings.EMAIL_BACKEND != 'django.core.mail.backends.smtp.EmailBackend':
+        return await sync_to_async(send_mail, thread_sensitive=False)(
+            subject=subject,
+            message=message,
+            from_email=from_email,
+            recipient_list=recipient_list,
+            html_message=html_message,
             fail_silently=False,
         )
-        return True, verification_link
+
+    email = EmailMultiAlternatives(subject, message, from_email, recipient_list)
+    if html_message:
+        email.attach_alternative(html_message, 'text/html')
+    await aiosmtplib.send(
+        email.message(),
+        sender=email.from_email,
+        recipients=email.recipients(),
+        hostname=settings.EMAIL_HOST,
+        port=int(settings.EMAIL_PORT),
+        username=settings.EMAIL_HOST_USER or None,
+        password=settings.EMAIL_HOST_PASSWORD or None,
+        start_tls=bool(settings.EMAIL_USE_TLS),
+        timeout=settings.EMAIL_TIMEOUT or SMTP_TIMEOUT,
+    )
+    return 1
+
+
+async def adeliver_mail(subject, message, from_email, recipient_list, html_message=None):
+    """Async counterpart of `deliver_mail`"""
+    if mail_via_jobs():
+        return await sync_to_async(deliver_mail)(
+            subject, message, from_email, recipient_list, html_message=html_message
+        )
+    return await asend_mail(subject, message, from_email, recipient_list, html_message=html_message)
+
+
+async def asend_verification_email(user):
+    verification_link, plain_message, html_message = build_verification_email(user)
+
+    try:
+        await adeliver_mail(
+            subject='Verify Your Email Address',
+            message=plain_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[user.email],
+            html_message=html_message,
+        )
+        return delivered_status(), verification_link
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return 'failed', str(e)
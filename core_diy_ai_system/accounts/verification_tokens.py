@@ -0,0 +1,53 @@
+"""
+Signed email-verification tokens.
+
+Tokens are `<user_id>.<base64 email>:<timestamp>:<signature>` produced by one
+process-wide TimestampSigner. The payload is a few dozen bytes, so it is not
+JSON-encoded or zlib-compressed. Tokens minted by the previous
+`signing.dumps(..., compress=True)` format are still accepted until they
+expire.
+"""
+import functools
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+VERIFICATION_SALT = 'email-verification'
+VERIFICATION_MAX_AGE = 86400  # 24 hours in seconds
+
+
+@functools.lru_cache(maxsize=None)
+def get_signer():
+    return signing.TimestampSigner(salt=VERIFICATION_SALT)
+
+
+@functools.lru_cache(maxsize=None)
+def verification_url_prefix():
+    return f"{settings.BACKEND_URL}{reverse('verify-email-confirm')}?token="
+
+
+def encode_verification_token(user_id, email):
+    return get_signer().sign(f'{user_id}.{signing.b64_encode(email.encode()).decode()}')
+
+
+def decode_verification_token(token, max_age=VERIFICATION_MAX_AGE):
+    """
+    {'user_id', 'email'} for a valid token.
+
+    Raises signing.BadSignature (or its SignatureExpired subclass) otherwise.
+    """
+    signer = get_signer()
+    value = signer.unsign(token, max_age=max_age)
+    user_id, separator, email = value.partition('.')
+    if separator and user_id.isdigit():
+        try:
+            return {'user_id': int(user_id), 'email': signing.b64_decode(email.encode()).decode()}
+        except (ValueError, UnicodeDecodeError) as e:
+            raise signing.BadSignature('Malformed verification token') from e
+    # Legacy token: base64 JSON, '.'-prefixed when zlib-compressed
+    return signer.unsign_object(token, max_age=max_age)
+
+
+def build_verification_link(user):
+    return verification_url_prefix() + encode_verification_token(user.id, user.email)
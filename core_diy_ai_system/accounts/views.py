@@ -1,30 +1,58 @@
-from django.shortcuts import render
 from django.template.loader import render_to_string
-from django.core.mail import send_mail 
 from rest_framework import status, generics
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
-from user_agents import parse
 from django.core import signing
 from django.shortcuts import redirect
-
-from .utils import send_verification_email
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.db import transaction
+from django.db.models import Sum
+
+from .utils import (
+    deliver_mail,
+    delivered_status,
+    send_verification_email,
+    get_device_info,
+    is_verification_token_used,
+    mark_verification_token_used
+)
+from .client_ip import get_client_ip
+from .failed_logins import record_failed_login
+from .idempotency import idempotent
+from .jobs import queue_stats
+from .jwks import get_jwks_document, jwt_keys_enabled
+from .lockout import lockout
+from .middleware import admission_controller
+from .resend import resend_verification
+from .tiered_cache import cache_stats, invalidate_user, profile_cache
+from .rollups import schedule_registration_rollup_refresh
+from .verification_tokens import decode_verification_token
 from .serializers import (
     UserRegistrationSerializer,
     UserSerializer,
+    UserReadSerializer,
     CustomTokenObtainPairSerializer,
     ForgotPasswordSerializer,
-    ResetPasswordSerializer
+    ResendVerificationSerializer,
+    ResetPasswordSerializer,
+    RegistrationFunnelQuerySerializer
 )
 
-from .models import EmailVerificationToken, PasswordResetToken, UserRegistrationInfo, UserDeviceInfo, FailedLoginAttempt
+from .models import (
+    EmailVerificationToken,
+    PasswordResetToken,
+    UserRegistrationInfo,
+    UserDeviceInfo,
+    RegistrationDailyRollup
+)
 
+import os
 import uuid
 
 # Create your views here.
@@ -36,23 +64,12 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = (AllowAny,)
     serializer_class = UserRegistrationSerializer
 
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def get_device_info(self, request):
-        user_agent_string = request.META.get('HTTP_USER_AGENT', '')
-        user_agent = parse(user_agent_string)
-        
-        return {
-            'device_type': 'mobile' if user_agent.is_mobile else 'tablet' if user_agent.is_tablet else 'desktop',
-            'os_type': f"{user_agent.os.family} {user_agent.os.version_string}",
-            'browser': f"{user_agent.browser.family} {user_agent.browser.version_string}"
-        }
+        return get_device_info(request.META.get('HTTP_USER_AGENT', ''))
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -62,7 +79,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
 
         # Get client information
-        ip_address = self.get_client_ip(request)
+        ip_address = get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         device_info = self.get_device_info(request)
         
@@ -80,6 +97,7 @@ class RegisterView(generics.CreateAPIView):
             ip_address=ip_address,
             **device_info
         )
+        schedule_registration_rollup_refresh()
 
         # Create verification token
         token = str(uuid.uuid4())
@@ -90,11 +108,11 @@ class RegisterView(generics.CreateAPIView):
         )
         
         # Send verification email
-        email_sent, verification_info = send_verification_email(user)
+        email_status, verification_info = send_verification_email(user)
 
         response_data = {
             'message': 'Registration successful. Please check your email to verify your account.',
-            'email_status': 'sent' if email_sent else 'failed'
+            'email_status': email_status
         }
 
         # In debug mode, include the verification link
@@ -102,7 +120,7 @@ class RegisterView(generics.CreateAPIView):
             response_data['debug_info'] = {
                 'verification_link': verification_info
             }
-        if not email_sent:
+        if email_status == 'failed':
             response_data['error'] = verification_info
         
         return Response(response_data, status=status.HTTP_201_CREATED)
@@ -111,49 +129,42 @@ class RegisterView(generics.CreateAPIView):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
     def post(self, request, *args, **kwargs):
+        email = request.data.get('email', '')
+        ip_address = get_client_ip(request)
+
+        # Locked-out logins are refused before any database or hashing work
+        retry_after = lockout.retry_after(email, ip_address)
+        if retry_after:
+            return self.locked_out_response(retry_after)
+
         serializer = self.get_serializer(data=request.data)
         
         try:
             serializer.is_valid(raise_exception=True)
+            lockout.reset(email)
             # If valid, return the tokens
             return Response(serializer.validated_data)
             
         except Exception as e:
-            # Track failed login attempt
-            email = request.data.get('email', '')
-            ip_address = self.get_client_ip(request)
-            
-            FailedLoginAttempt.objects.create(
-                email=email,
-                ip_address=ip_address
-            )
-            
-            # You can add logic here to check for multiple failed attempts
-            recent_failures = FailedLoginAttempt.objects.filter(
-                email=email,
-                ip_address=ip_address,
-                timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
-            ).count()
-            
-            # Return error response
-            error_message = 'Invalid email or password'
-            if recent_failures >= 5:  # You can adjust this threshold
-                error_message = 'Too many failed attempts. Please try again later.'
+            # Lockout counters first: they are seeded from the recorded history
+            retry_after = lockout.register_failure(email, ip_address)
+            record_failed_login(email, ip_address)
+            if retry_after:
+                return self.locked_out_response(retry_after)
                 
             return Response(
-                {'detail': error_message},
+                {'detail': 'Invalid email or password'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
+    def locked_out_response(self, retry_after):
+        return Response(
+            {'detail': 'Too many failed attempts. Please try again later.'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(retry_after)}
+        )
+
 # class VerifyEmailView(APIView):
 #     permission_classes = (AllowAny,)
 
@@ -198,9 +209,19 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
 
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return UserReadSerializer
+        return UserSerializer
+
     def get_object(self):
         return self.request.user
 
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        # User.save() and email verification invalidate the cached payload
+        return Response(profile_cache.get_or_load(user.pk, lambda: UserReadSerializer(user).data))
+
 class ForgotPasswordView(APIView):
     permission_classes = (AllowAny,)
     serializer_class = ForgotPasswordSerializer
@@ -224,26 +245,24 @@ class ForgotPasswordView(APIView):
 
         try:
             # Send email
-            send_mail(
+            deliver_mail(
                 subject='Reset Your Password',
                 message=plain_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[user.email],
                 html_message=html_message,
-                fail_silently=False,
             )
-            return True, None
+            return delivered_status(), None
         except Exception as e:
-            return False, str(e)
+            return 'failed', str(e)
 
+    @idempotent
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        email = serializer.validated_data['email']
-        
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.get(pk=serializer.validated_data['user_id'])
             
             # Generate unique token
             token = str(uuid.uuid4())
@@ -260,7 +279,7 @@ class ForgotPasswordView(APIView):
             reset_link = f"{settings.FRONTEND_URL}/reset-password/{token}"
             
             # Send email
-            email_sent, error = self.send_password_reset_email(user, reset_link)
+            email_status, error = self.send_password_reset_email(user, reset_link)
             
             response_data = {
                 'message': 'Password reset instructions have been sent to your email.'
@@ -270,9 +289,9 @@ class ForgotPasswordView(APIView):
             if settings.DEBUG:
                 response_data['debug_info'] = {
                     'reset_link': reset_link,
-                    'email_status': 'sent' if email_sent else 'failed',
+                    'email_status': email_status,
                 }
-                if not email_sent:
+                if email_status == 'failed':
                     response_data['debug_info']['error'] = error
             
             return Response(response_data)
@@ -288,6 +307,7 @@ class ResetPasswordView(APIView):
     permission_classes = (AllowAny,)
     serializer_class = ResetPasswordSerializer
 
+    @idempotent
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -305,34 +325,171 @@ class VerifyEmailConfirmView(APIView):
 
     def get(self, request):
         token = request.GET.get('token')
+        if not token:
+            return redirect(f"{settings.FRONTEND_URL}/verification/error")
+
+        # Replayed links are answered from the used-token set
+        if is_verification_token_used(token):
+            return redirect(f"{settings.FRONTEND_URL}/verification/already-verified")
+
         try:
             # Verify the signed token
-            data = signing.loads(
-                token, 
-                salt='email-verification', 
-                max_age=86400  # 24 hours in seconds
-            )
-            
-            # Get and verify user
-            user = User.objects.get(id=data['user_id'], email=data['email'])
-            
-            if user.is_email_verified:
-                return redirect(f"{settings.FRONTEND_URL}/verification/already-verified")
-            
-            user.is_email_verified = True
-            user.save()
-            
-            # Update registration info if exists
-            UserRegistrationInfo.objects.filter(user=user).update(
-                registration_status='verified',
-                verified_at=timezone.now()
-            )
-            
-            # Redirect to frontend success page
-            return redirect(f"{settings.FRONTEND_URL}/verification/success")
-            
-        except (signing.BadSignature, signing.SignatureExpired):
+            data = decode_verification_token(token)
+        except signing.BadSignature:
             # Redirect to frontend error page
             return redirect(f"{settings.FRONTEND_URL}/verification/error")
-        except User.DoesNotExist:
-            return redirect(f"{settings.FRONTEND_URL}/verification/error")
+
+        verified_at = timezone.now()
+        with transaction.atomic():
+            # Single conditional UPDATE instead of fetching and re-saving the user
+            verified = User.objects.filter(
+                id=data['user_id'],
+                email=data['email'],
+                is_email_verified=False
+            ).update(is_email_verified=True, updated_at=verified_at)
+
+            if verified:
+                UserRegistrationInfo.objects.filter(user_id=data['user_id']).update(
+                    registration_status='verified',
+                    verified_at=verified_at
+                )
+                invalidate_user(data['user_id'])
+
+        if not verified:
+            if not User.objects.filter(id=data['user_id'], email=data['email']).exists():
+                return redirect(f"{settings.FRONTEND_URL}/verification/error")
+            mark_verification_token_used(token)
+            return redirect(f"{settings.FRONTEND_URL}/verification/already-verified")
+
+        mark_verification_token_used(token)
+        schedule_registration_rollup_refresh()
+
+        # Redirect to frontend success page
+        return redirect(f"{settings.FRONTEND_URL}/verification/success")
+
+
+class ResendVerificationView(APIView):
+    permission_classes = (AllowAny,)
+    serializer_class = ResendVerificationSerializer
+
+    @idempotent
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = User.objects.filter(
+            email=serializer.validated_data['email'],
+            is_email_verified=False,
+            is_active=True
+        ).first()
+
+        email_status, error = 'skipped', None
+        if user is not None:
+            try:
+                if resend_verification([user]):
+                    email_status = delivered_status()
+            except Exception as e:
+                email_status, error = 'failed', str(e)
+
+        # Same answer for unknown, verified and cooling-down addresses
+        response_data = {
+            'message': 'If an account with this email address is awaiting verification, a new verification link has been sent.'
+        }
+        if settings.DEBUG:
+            response_data['debug_info'] = {'email_status': email_status}
+            if error:
+                response_data['debug_info']['error'] = error
+        return Response(response_data)
+
+
+class RegistrationFunnelView(APIView):
+    """Signup -> verification conversion served from the daily rollups"""
+    permission_classes = (IsAdminUser,)
+
+    @staticmethod
+    def with_rate(row):
+        row['conversion_rate'] = (
+            round(row['verified'] / row['registrations'], 4) if row['registrations'] else 0.0
+        )
+        return row
+
+    def get(self, request):
+        serializer = RegistrationFunnelQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        rollups = RegistrationDailyRollup.objects.filter(day__range=(params['start'], params['end']))
+        if 'source' in params:
+            rollups = rollups.filter(registration_source=params['source'])
+        if 'device_type' in params:
+            rollups = rollups.filter(device_type=params['device_type'])
+
+        totals = {'registrations': Sum('registrations'), 'verified': Sum('verified')}
+        overall = rollups.aggregate(**totals)
+
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'totals': self.with_rate({
+                'registrations': overall['registrations'] or 0,
+                'verified': overall['verified'] or 0,
+            }),
+            'days': [
+                self.with_rate(row)
+                for row in rollups.values('day').annotate(**totals).order_by('day')
+            ],
+            'by_source': [
+                self.with_rate(row)
+                for row in rollups.values('registration_source').annotate(**totals).order_by('registration_source')
+            ],
+            'by_device': [
+                self.with_rate(row)
+                for row in rollups.values('device_type').annotate(**totals).order_by('device_type')
+            ],
+        })
+
+
+class AdmissionStatsView(APIView):
+    """Admission-control counters of the worker that serves this request"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            **admission_controller.snapshot(),
+        })
+
+
+class CacheStatsView(APIView):
+    """Tiered cache hit/miss counters of the worker that serves this request"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'caches': cache_stats()})
+
+
+class JobStatsView(APIView):
+    """Background job queue depth and latency per queue"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(queue_stats())
+
+
+class JWKSView(APIView):
+    """Public keys for verifying access tokens, for gateways and other services"""
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+
+    def get(self, request):
+        if not jwt_keys_enabled():
+            return HttpResponseNotFound()
+
+        body, etag = get_jwks_document()
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
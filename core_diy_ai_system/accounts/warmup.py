@@ -0,0 +1,64 @@
+"""
+Load the accounts app's expensive lazy state up front.
+
+Called from wsgi.py so that, under `gunicorn --preload`, the ua-parser regex
+table, compiled email templates, URL resolver and JWT keys are built once in the
+master process and shared with every forked worker via copy-on-write.
+"""
+import gc
+import time
+
+from django.template.loader import get_template
+
+from .jwks import get_jwks_document, jwt_keys_enabled
+from .utils import get_device_info, verification_email_templates
+from .verification_tokens import get_signer, verification_url_prefix
+
+EMAIL_TEMPLATES = (
+    'accounts/emails/password_reset.html',
+    'accounts/emails/password_reset.txt',
+)
+
+SAMPLE_USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.0 Mobile/15E148 Safari/604.1',
+)
+
+
+def warm(freeze=False):
+    """
+    Build the lazy state and return how long each step took, in seconds.
+
+    With `freeze=True` the surviving objects are moved to the permanent GC
+    generation so collections in the workers do not touch (and copy) the
+    shared pages.
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    for user_agent in SAMPLE_USER_AGENTS:
+        get_device_info(user_agent)
+    timings['user_agents'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for template_name in EMAIL_TEMPLATES:
+        get_template(template_name)
+    verification_email_templates()
+    timings['templates'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    verification_url_prefix()
+    get_signer()
+    timings['urls'] = time.perf_counter() - started
+
+    if jwt_keys_enabled():
+        started = time.perf_counter()
+        get_jwks_document()
+        timings['jwt_keys'] = time.perf_counter() - started
+
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return timings
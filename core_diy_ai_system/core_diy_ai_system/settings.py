@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'accounts.staticfiles.StaticFilesMiddleware',
+    'accounts.middleware.AdmissionControlMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -102,19 +104,50 @@ DATABASES = {
 AUTH_USER_MODEL = 'accounts.User'
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point CACHE_BACKEND/CACHE_LOCATION at a shared backend (e.g. Redis) when
+# running more than one worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('CACHE_LOCATION') or '',
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    # LocMemCache culls beyond 300 entries by default, which would evict
+    # lockout counters, idempotency keys and used verification tokens
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES') or 100000)}
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson-backed JSON; both fall back to the stdlib without orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'accounts.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'accounts.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 
+# Write last_login in periodic batches (accounts.last_login) instead of
+# updating the user row on every login
+ACCOUNTS_BATCH_LAST_LOGIN = os.getenv('ACCOUNTS_BATCH_LAST_LOGIN') == 'True'
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': not ACCOUNTS_BATCH_LAST_LOGIN,
 
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -122,6 +155,68 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Login lockouts (accounts.lockout). Failures are counted per account, per IP
+# and per network; each lockout doubles the previous one.
+ACCOUNT_LOCKOUT = {
+    'ACCOUNT_THRESHOLD': 5,
+    'IP_THRESHOLD': 20,
+    'NETWORK_THRESHOLD': 100,
+    'BASE_DELAY': 60,
+    'MAX_DELAY': 24 * 60 * 60,
+    'WINDOW': 24 * 60 * 60,
+}
+
+# Append-only JSON-lines log of individual failed logins (accounts.failed_logins).
+# The database only keeps per-5-minute counters.
+FAILED_LOGIN_LOG_FILE = os.getenv('FAILED_LOGIN_LOG_FILE') or None
+if FAILED_LOGIN_LOG_FILE:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'failed_logins': {
+                # Reopens the file after logrotate moves it
+                'class': 'logging.handlers.WatchedFileHandler',
+                'filename': FAILED_LOGIN_LOG_FILE,
+            },
+        },
+        'loggers': {
+            'accounts.failed_logins': {
+                'handlers': ['failed_logins'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+        },
+    }
+
+# Reverse proxies whose X-Forwarded-For entries are believed (accounts.client_ip).
+# Comma-separated CIDRs, e.g. the load balancer subnet; the default trusts
+# only a proxy on the same host.
+TRUSTED_PROXIES = (os.getenv('TRUSTED_PROXIES') or '127.0.0.1/32,::1/128').split(',')
+
+# Per-worker admission control (accounts.middleware). When a worker is busy,
+# signups and password-reset requests are shed with 503 before token refresh
+# and profile reads are affected. Shed counters: /api/admission/stats/.
+ACCOUNT_ADMISSION_CONTROL = {
+    'ENABLED': os.getenv('ACCOUNTS_ADMISSION_CONTROL', 'True') != 'False',
+    'MAX_IN_FLIGHT': int(os.getenv('ACCOUNTS_MAX_IN_FLIGHT') or 16),
+    'LOW_SHARE': 0.5,
+    'LATENCY_TARGET': 0.5,
+    'QUEUE_TIMEOUT': 0.1,
+}
+
+# Asymmetric token signing (accounts.jwks). When JWT_KEYS_DIR is set, tokens
+# are signed with the RS256/EdDSA private key `<kid>.pem` named by
+# JWT_ACTIVE_KID (default: last file name in sort order), and the public half
+# of every key in the directory is served at /api/.well-known/jwks.json.
+# To rotate, add a new key and make it active; delete the old file once
+# REFRESH_TOKEN_LIFETIME has passed. Requires `cryptography`.
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR')
+JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID')
+# ISO 8601 time JWT_KEYS_DIR was first enabled. HS256 tokens issued before it
+# keep working for REFRESH_TOKEN_LIFETIME after it; unset, they are rejected.
+JWT_LEGACY_CUTOVER = os.getenv('JWT_LEGACY_CUTOVER')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -162,6 +257,22 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
 
+# Content-hashed names plus precompressed .gz/.br variants (accounts.staticfiles);
+# run `manage.py collectstatic` on deploy. .br files need the optional
+# `brotli` package.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'accounts.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Serve STATIC_ROOT from the app process with far-future cache headers, for
+# deployments without a web server or CDN in front
+ACCOUNTS_SERVE_STATIC = os.getenv('ACCOUNTS_SERVE_STATIC', str(not DEBUG)) == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -172,6 +283,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 BACKEND_URL = os.getenv('BACKEND_URL')
 
 # Email settings
+# The async views send mail with aiosmtplib when it is installed and the SMTP
+# backend is configured, and fall back to EMAIL_BACKEND in a thread otherwise.
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 else:
@@ -185,6 +298,28 @@ else:
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 FRONTEND_URL = os.getenv('FRONTEND_URL')
 
+# URL names served by the ASGI-native views in accounts.async_views instead
+# of the DRF views, e.g. ACCOUNTS_ASYNC_VIEWS=register,login. Only useful
+# when running under an ASGI server.
+ACCOUNTS_ASYNC_VIEWS = {
+    name.strip() for name in (os.getenv('ACCOUNTS_ASYNC_VIEWS') or '').split(',') if name.strip()
+}
+
+# Load ua-parser tables, email templates and URLs when wsgi/asgi.py is
+# imported, i.e. once in the master under `gunicorn --preload`
+ACCOUNTS_WARMUP_ON_STARTUP = os.getenv('ACCOUNTS_WARMUP_ON_STARTUP') != 'False'
+
+# Refresh the registration funnel rollups after every signup/verification.
+# The refresh runs in the request thread after commit, so it adds to signup
+# latency; leave off when `manage.py refresh_registration_rollups` runs on a
+# schedule or `manage.py run_jobs` workers run the periodic refresh.
+ACCOUNTS_ROLLUP_ON_COMMIT = os.getenv('ACCOUNTS_ROLLUP_ON_COMMIT') == 'True'
+
+# Send account emails from `manage.py run_jobs` workers (accounts.jobs)
+# instead of inside the request. The workers also expire old tokens and
+# refresh the registration rollups on a schedule.
+ACCOUNTS_MAIL_VIA_JOBS = os.getenv('ACCOUNTS_MAIL_VIA_JOBS') == 'True'
+
 
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
@@ -202,6 +337,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
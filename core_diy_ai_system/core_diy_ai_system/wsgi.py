@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core_diy_ai_system.settings')
 
 application = get_wsgi_application()
+
+# Build lazily loaded state before the server forks workers (see accounts.warmup)
+from django.conf import settings  # noqa: E402
+
+if settings.ACCOUNTS_WARMUP_ON_STARTUP:
+    from accounts.warmup import warm  # noqa: E402
+
+    warm(freeze=True)